@@ -27,6 +27,7 @@ class UpdateActivityLog:
         status: str = actlog_enums.UpdateStatus.PENDING.name,
         caller_type: str = "",
         subinfo: dict = {},
+        error_msg: str = "",
     ) -> m_actlog.ActivityLog | None:
         activitylog = m_actlog.ActivityLog(
             target_id=target_id,
@@ -35,6 +36,7 @@ class UpdateActivityLog:
             current_state=status,
             caller_type=caller_type,
             meta=convert_datetime_to_str_in_dict(subinfo),
+            error_msg=error_msg,
         )
         await self.repository.save_all([activitylog])
         await self.session.refresh(activitylog)
@@ -24,7 +24,20 @@ async def get_activitylog_latest(
     return lastest_actlog
 
 
-async def is_updating_urls_or_sending_to_api(updateactlog: UpdateActivityLog):
+async def is_updating_urls_or_sending_to_api(
+    updateactlog: UpdateActivityLog, exclude_ids: list[int] | None = None
+):
+    if exclude_ids:
+        db_actlogs = await updateactlog.get_all(
+            command=act_cmd.ActivityLogGetCommand(
+                activity_types=[
+                    update_const.SCRAPING_URL_ACTIVITY_TYPE,
+                    noti_const.SEND_LOG_ACTIVITY_TYPE,
+                ],
+                current_states=[act_enums.UpdateStatus.IN_PROGRESS.name],
+            )
+        )
+        return any(db_actlog.id not in exclude_ids for db_actlog in db_actlogs)
     db_actlog = await get_activitylog_latest(
         upactivitylog=updateactlog,
         activity_types=[
@@ -1,3 +1,4 @@
+from typing import Awaitable, Callable
 from urllib.parse import urlparse
 
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -5,27 +6,48 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from domain.models.pricelog import pricelog as m_pricelog
 from databases.sql.pricelog import repository as db_repo
 
-from . import db_convert
 from app.getdata.models import search as search_model
-from app.getdata import get_search
+from app.getdata import get_search, get_search_stream
+from app.getdata.db_convert import searchresults_to_rows
 
 
-async def save_result(pricelog_list: list[m_pricelog.PriceLog], ses: AsyncSession):
+async def save_result(pricelog_list: list[m_pricelog.PriceLogRow], ses: AsyncSession):
     pricelogrepo = db_repo.PriceLogRepository(ses=ses)
-    await pricelogrepo.save_all(pricelog_entries=pricelog_list)
+    await pricelogrepo.save_rows(rows=pricelog_list)
 
 
 async def download_with_api(
-    ses: AsyncSession, searchreq: search_model.SearchRequest, save_to_db: bool = True
+    ses: AsyncSession,
+    searchreq: search_model.SearchRequest,
+    save_to_db: bool = True,
+    use_cache: bool = True,
 ):
     if not searchreq.search_keyword and not searchreq.url:
         return False, f"Either search_keyword or url is required."
-    ok, result = await get_search(searchreq=searchreq)
+    ok, result = await get_search(searchreq=searchreq, use_cache=use_cache)
     if not ok:
         return ok, result
     if not isinstance(result, search_model.SearchResults):
         return False, f"type is not SearchResults, type:{type(result)}, value:{result}"
-    pricelog_list = db_convert.DBModelConvert.searchresult_to_db_models(results=result)
+    pricelog_list = searchresults_to_rows(results=result, sitename=searchreq.sitename)
     if save_to_db:
         await save_result(pricelog_list=pricelog_list, ses=ses)
     return ok, pricelog_list
+
+
+async def download_with_api_stream(
+    searchreq: search_model.SearchRequest,
+    handle: Callable[[list[m_pricelog.PriceLogRow]], Awaitable[None]],
+    chunk_size: int,
+):
+    if not searchreq.search_keyword and not searchreq.url:
+        return False, f"Either search_keyword or url is required."
+
+    async def _convert(results: list[search_model.SearchResult]):
+        await handle(
+            searchresults_to_rows(results=results, sitename=searchreq.sitename)
+        )
+
+    return await get_search_stream(
+        searchreq=searchreq, handle=_convert, chunk_size=chunk_size
+    )
@@ -1,3 +1,21 @@
-from .getdata import get_search, get_search_info
+from .getdata import (
+    get_search,
+    get_search_batch,
+    get_search_info,
+    get_search_stats,
+    get_search_stream,
+)
+from .client import close_client, http_client_lifespan
+from .cache import close_search_cache, search_cache_lifespan
 
-__all__ = ["get_search", "get_search_info"]
+__all__ = [
+    "get_search",
+    "get_search_batch",
+    "get_search_info",
+    "get_search_stats",
+    "get_search_stream",
+    "close_client",
+    "http_client_lifespan",
+    "close_search_cache",
+    "search_cache_lifespan",
+]
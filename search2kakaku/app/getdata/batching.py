@@ -0,0 +1,232 @@
+import asyncio
+import math
+import time
+
+import httpx
+
+from common import read_config
+from .client import get_client
+from .factory import APIPathOptionFactory
+from .enums import APIURLName
+from .util import create_api_url
+from .models.error import APIError
+
+# バッチ API が無いことを示すステータス
+UNSUPPORTED_STATUS_CODES = (404, 405, 501)
+
+
+class BatchCapability:
+    """Whether the search API supports batch calls, checked with the capabilities API."""
+
+    def __init__(self):
+        self.supported = False
+        self.max_batch_size: int | None = None
+        self.checked_at: float | None = None
+        self._lock: asyncio.Lock | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    def set_unsupported(self):
+        self.supported = False
+        self.max_batch_size = None
+        self.checked_at = time.monotonic()
+
+    async def _probe(self, timeout: float):
+        apiopt = APIPathOptionFactory().create(apiurlname=APIURLName.CAPABILITIES)
+        try:
+            res = await get_client().get(create_api_url(apiopt=apiopt), timeout=timeout)
+            res.raise_for_status()
+            res_json = res.json()
+        except Exception:
+            self.set_unsupported()
+            return
+        if not isinstance(res_json, dict) or not res_json.get("search_batch"):
+            self.set_unsupported()
+            return
+        self.supported = True
+        max_batch_size = res_json.get("max_batch_size")
+        self.max_batch_size = (
+            max_batch_size if isinstance(max_batch_size, int) else None
+        )
+        self.checked_at = time.monotonic()
+
+    async def is_supported(self, opts: read_config.SearchBatchOptions) -> bool:
+        async with self._get_lock():
+            if (
+                self.checked_at is None
+                or time.monotonic() - self.checked_at >= opts.probe_interval
+            ):
+                await self._probe(timeout=opts.probe_timeout)
+        return self.supported
+
+    def get_batch_size(self, opts: read_config.SearchBatchOptions) -> int:
+        if self.max_batch_size:
+            return max(min(opts.max_batch_size, self.max_batch_size), 1)
+        return opts.max_batch_size
+
+
+class SearchBatcher:
+    """
+    Send concurrent search calls as one batch call.
+
+    Calls of the same site arriving within `window` seconds are sent together, up
+    to the batch size. Results are returned in the order of the requests. When
+    the API does not support batch calls, each request is sent on its own. The
+    timeout of a batch call is the longest timeout of its requests times the
+    number of rounds the API needs at `concurrency` searches at once; when it
+    times out, the requests are sent again on their own. Callers are rate
+    limited before they get here, so only calls in flight at the same time are
+    grouped.
+    """
+
+    batches: int
+    batched_requests: int
+    single_requests: int
+    batch_timeouts: int
+
+    def __init__(self):
+        self.capability = BatchCapability()
+        self.batches = 0
+        self.batched_requests = 0
+        self.single_requests = 0
+        self.batch_timeouts = 0
+        self._pending: dict[str, list[tuple[dict, float, asyncio.Future]]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _reset_if_loop_changed(self):
+        # Celery はタスク毎にイベントループが変わるため、前のループの待ちは破棄する
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._pending = {}
+            self._timers = {}
+            self._tasks = set()
+            self._loop = loop
+
+    async def submit(
+        self,
+        key: str,
+        data: dict,
+        timeout: float,
+        opts: read_config.SearchBatchOptions,
+        send_one,
+    ) -> tuple[bool, str, dict | None]:
+        """send_one(data, timeout) is used when batch calls are not available."""
+        self._reset_if_loop_changed()
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((data, timeout, future))
+        if len(pending) >= self.capability.get_batch_size(opts):
+            self._flush(key=key, opts=opts, send_one=send_one)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(
+                opts.window, self._flush, key, opts, send_one
+            )
+        return await future
+
+    def _flush(self, key: str, opts: read_config.SearchBatchOptions, send_one):
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        items = self._pending.pop(key, [])
+        if not items:
+            return
+        task = asyncio.ensure_future(
+            self._send(items=items, opts=opts, send_one=send_one)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send_singles(self, items, send_one):
+        self.single_requests += len(items)
+
+        async def _one(data: dict, timeout: float, future: asyncio.Future):
+            try:
+                result = await send_one(data, timeout)
+            except Exception as e:
+                result = (False, APIError.from_exception(e), None)
+            if not future.done():
+                future.set_result(result)
+
+        await asyncio.gather(*[_one(*item) for item in items])
+
+    async def _send(self, items, opts: read_config.SearchBatchOptions, send_one):
+        if len(items) == 1 or not await self.capability.is_supported(opts):
+            await self._send_singles(items=items, send_one=send_one)
+            return
+        batch_size = self.capability.get_batch_size(opts)
+        chunks = [items[i : i + batch_size] for i in range(0, len(items), batch_size)]
+        await asyncio.gather(
+            *[
+                self._send_batch(items=chunk, opts=opts, send_one=send_one)
+                for chunk in chunks
+            ]
+        )
+
+    async def _send_batch(self, items, opts: read_config.SearchBatchOptions, send_one):
+        apiopt = APIPathOptionFactory().create(apiurlname=APIURLName.SEARCH_BATCH)
+        data = {"requests": [data for data, _, _ in items]}
+        # API はバッチ内の検索を concurrency 件ずつ実行するため、その回数分待つ
+        timeout = max(timeout for _, timeout, _ in items) * math.ceil(
+            len(items) / opts.concurrency
+        )
+        try:
+            res = await get_client().post(
+                create_api_url(apiopt=apiopt), json=data, timeout=timeout
+            )
+            if res.status_code in UNSUPPORTED_STATUS_CODES:
+                self.capability.set_unsupported()
+                await self._send_singles(items=items, send_one=send_one)
+                return
+            res.raise_for_status()
+            res_json = res.json()
+        except httpx.TimeoutException:
+            # バッチ全体を失敗にせず、1件ずつ送り直す
+            self.batch_timeouts += 1
+            await self._send_singles(
+                items=[item for item in items if not item[2].done()],
+                send_one=send_one,
+            )
+            return
+        except Exception as e:
+            for _, _, future in items:
+                if not future.done():
+                    future.set_result((False, APIError.from_exception(e), None))
+            return
+        results = res_json.get("results") if isinstance(res_json, dict) else None
+        if not isinstance(results, list) or len(results) != len(items):
+            msg = f"invalid batch response, {res_json}"
+            for _, _, future in items:
+                if not future.done():
+                    future.set_result((False, msg, None))
+            return
+        self.batches += 1
+        self.batched_requests += len(items)
+        for (_, _, future), result in zip(items, results):
+            if future.done():
+                continue
+            if not isinstance(result, dict):
+                future.set_result(
+                    (
+                        False,
+                        f"invalid type response, type:{type(result)}, {result}",
+                        None,
+                    )
+                )
+                continue
+            future.set_result((True, "", result))
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "batched_requests": self.batched_requests,
+            "single_requests": self.single_requests,
+            "batch_timeouts": self.batch_timeouts,
+        }
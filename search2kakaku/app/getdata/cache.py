@@ -0,0 +1,190 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from common import read_config
+from .models.search import SearchRequest
+from .util import create_search_key
+
+REDIS_KEY_PREFIX = "search2kakaku:search:"
+REDIS_INDEX_KEY = "search2kakaku:search_index"
+
+
+def get_cache_ttl(sitename: str, opts: read_config.SearchCacheOptions) -> float:
+    return opts.site_ttl.get(sitename, opts.ttl)
+
+
+class ISearchCacheBackend(ABC):
+    bound_to_loop: bool = False
+
+    @abstractmethod
+    async def get(self, key: str) -> str | None:
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: float):
+        pass
+
+    async def close(self):
+        pass
+
+
+class MemoryCacheBackend(ISearchCacheBackend):
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    async def get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class RedisCacheBackend(ISearchCacheBackend):
+    """
+    Cache on the Redis used by Celery.
+
+    Entries expire with the Redis TTL. A sorted set keeps the last access time
+    of each key, and the least recently used keys are removed when there are
+    more than max_entries.
+    """
+
+    bound_to_loop = True
+
+    def __init__(self, max_entries: int, redisopts: read_config.RedisOptions):
+        # redis は celery[redis] と一緒に入るが、使う場合にのみ読み込む
+        from redis import asyncio as aioredis
+
+        self.max_entries = max_entries
+        self.client = aioredis.Redis(
+            host=redisopts.host, port=redisopts.port, db=redisopts.db
+        )
+
+    async def get(self, key: str) -> str | None:
+        value = await self.client.get(REDIS_KEY_PREFIX + key)
+        if value is None:
+            await self.client.zrem(REDIS_INDEX_KEY, key)
+            return None
+        await self.client.zadd(REDIS_INDEX_KEY, {key: time.time()})
+        return value.decode()
+
+    async def set(self, key: str, value: str, ttl: float):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(REDIS_KEY_PREFIX + key, value, px=max(int(ttl * 1000), 1))
+            pipe.zadd(REDIS_INDEX_KEY, {key: time.time()})
+            pipe.zcard(REDIS_INDEX_KEY)
+            *_, count = await pipe.execute()
+        if count <= self.max_entries:
+            return
+        evicted = await self.client.zpopmin(REDIS_INDEX_KEY, count - self.max_entries)
+        if evicted:
+            await self.client.delete(
+                *[REDIS_KEY_PREFIX + k.decode() for k, _ in evicted]
+            )
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_backend(opts: read_config.SearchCacheOptions) -> ISearchCacheBackend:
+    match opts.backend:
+        case "redis":
+            return RedisCacheBackend(
+                max_entries=opts.max_entries,
+                redisopts=read_config.get_redis_options(),
+            )
+        case "memory":
+            return MemoryCacheBackend(max_entries=opts.max_entries)
+        case _:
+            raise ValueError(f"no support cache backend, {opts.backend}")
+
+
+class SearchCache:
+    """
+    Cache of successful search responses keyed by the normalized SearchRequest.
+
+    The backend is created on first use. The redis client belongs to the event
+    loop, so it is created again when used from another loop.
+    """
+
+    hits: int
+    misses: int
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._backend: ISearchCacheBackend | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _get_backend(self, opts: read_config.SearchCacheOptions):
+        loop = asyncio.get_running_loop()
+        if self._backend is None or (
+            self._backend.bound_to_loop and self._loop is not loop
+        ):
+            self._backend = create_backend(opts)
+            self._loop = loop
+        return self._backend
+
+    async def get(
+        self, searchreq: SearchRequest, opts: read_config.SearchCacheOptions
+    ) -> str | None:
+        value = await self._get_backend(opts).get(create_search_key(searchreq))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(
+        self,
+        searchreq: SearchRequest,
+        value: str,
+        opts: read_config.SearchCacheOptions,
+    ):
+        ttl = get_cache_ttl(sitename=searchreq.sitename, opts=opts)
+        if ttl <= 0:
+            return
+        await self._get_backend(opts).set(
+            key=create_search_key(searchreq), value=value, ttl=ttl
+        )
+
+    async def close(self):
+        backend, loop = self._backend, self._loop
+        self._backend = None
+        self._loop = None
+        if backend and (
+            not backend.bound_to_loop or loop is asyncio.get_running_loop()
+        ):
+            await backend.close()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+search_cache = SearchCache()
+
+
+async def close_search_cache():
+    await search_cache.close()
+
+
+@asynccontextmanager
+async def search_cache_lifespan():
+    try:
+        yield search_cache
+    finally:
+        await close_search_cache()
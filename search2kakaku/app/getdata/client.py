@@ -0,0 +1,54 @@
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+
+import httpx
+
+from common import read_config
+
+# 接続はイベントループに属するため、ループ毎にクライアントを持つ
+_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _create_client(opts: read_config.HTTPClientOptions) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=opts.http2,
+        limits=httpx.Limits(
+            max_connections=opts.max_connections,
+            max_keepalive_connections=opts.max_keepalive_connections,
+            keepalive_expiry=opts.keepalive_expiry,
+        ),
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the shared client for external_search.
+
+    One client is kept per event loop, created on first use in the loop and
+    kept until close_client() is called in that loop. Clients of other loops,
+    e.g. the API server and a worker thread, are left open.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _create_client(read_config.get_api_options().get_data.client)
+        _clients[loop] = client
+    return client
+
+
+async def close_client():
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is None or client.is_closed:
+        return
+    await client.aclose()
+
+
+@asynccontextmanager
+async def http_client_lifespan():
+    try:
+        yield get_client()
+    finally:
+        await close_client()
@@ -1,4 +1,6 @@
 API_OPTIONS = {
     "search": {"path": "search/", "method": "post"},
     "search_info": {"path": "search/info/", "method": "post"},
+    "search_batch": {"path": "search/batch/", "method": "post"},
+    "capabilities": {"path": "capabilities/", "method": "get"},
 }
@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+
+from pydantic import BaseModel, Field
+
+from domain.models.pricelog import pricelog as m_pricelog
+from common import constants
+from app.enums import SiteName
+from .models import search as search_model
+
+
+class SiteExtras(BaseModel):
+    """
+    Columns that a site fills from SearchResult.others.
+
+    columns maps a PriceLog column to a key of others; an empty value keeps the
+    column default. With keep_others, others is saved as it is.
+    """
+
+    columns: dict[str, str] = Field(default_factory=dict)
+    keep_others: bool = False
+
+
+SITE_EXTRAS: dict[str, SiteExtras] = {
+    SiteName.SOFMAP.value: SiteExtras(
+        columns={"point": "point", "sub_price": "sub_price"}
+    ),
+    SiteName.GEO.value: SiteExtras(keep_others=True),
+    SiteName.IOSYS.value: SiteExtras(),
+    SiteName.GEMINI.value: SiteExtras(keep_others=True),
+}
+
+
+def searchresults_to_rows(
+    results: search_model.SearchResults | list[search_model.SearchResult],
+    sitename: str,
+) -> list[m_pricelog.PriceLogRow]:
+    if isinstance(results, search_model.SearchResults):
+        results = results.results
+    if not results:
+        return []
+    extras = SITE_EXTRAS.get(sitename, SiteExtras())
+    # executemany でまとめて INSERT できるよう、全ての行に同じ列を持たせる
+    now = datetime.now(timezone.utc)
+    rows: list[m_pricelog.PriceLogRow] = []
+    for result in results:
+        row: m_pricelog.PriceLogRow = {
+            "title": result.title,
+            "price": result.price,
+            "condition": result.condition,
+            "on_sale": result.on_sale,
+            "salename": result.salename,
+            "is_success": result.is_success,
+            "image_url": result.image_url,
+            "stock_msg": result.stock_msg,
+            "point": constants.NONE_POINT,
+            "stock_quantity": result.stock_quantity,
+            "used_list_url": result.sub_urls[0] if result.sub_urls else "",
+            "sub_price": constants.NONE_PRICE,
+            "others": {},
+            "created_at": now,
+            "updated_at": now,
+            "is_deleted": False,
+            "url": result.url,
+            "shop": result.sitename,
+        }
+        if result.others:
+            for column, key in extras.columns.items():
+                if result.others.get(key):
+                    row[column] = result.others[key]
+            if extras.keep_others:
+                row["others"] = result.others
+        rows.append(row)
+    return rows
@@ -4,3 +4,5 @@ from common.enums import AutoLowerName, auto
 class APIURLName(AutoLowerName):
     SEARCH = auto()
     SEARCH_INFO = auto()
+    SEARCH_BATCH = auto()
+    CAPABILITIES = auto()
@@ -1,50 +1,104 @@
-import httpx
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from pydantic import BaseModel, TypeAdapter, ValidationError, create_model
 
 from common import read_config
 from .factory import APIPathOptionFactory
 from .enums import APIURLName
-from .util import create_api_url
+from .util import create_api_url, create_search_key
 from .models.info import InfoRequest, InfoResponse
-from .models.search import SearchRequest, SearchResponse
-from .models.error import ErrorMsg
+from .models.search import SearchRequest, SearchResponse, SearchResult
+from .models.error import APIError, ErrorMsg
+from .singleflight import SingleFlight
+from .hedging import Hedger
+from .client import get_client
+from .cache import search_cache
+from .batching import SearchBatcher
+from .streaming import stream_search
+
+search_flight = SingleFlight()
+search_hedger = Hedger()
+search_batcher = SearchBatcher()
+
+
+class ResponseDecoder:
+    """
+    Validate an API response in one pass, directly from the response bytes.
+
+    The response model is extended with the `detail` field of ErrorMsg, so the
+    success and error shapes are told apart by the fields that are set instead
+    of by a failed validation.
+    """
+
+    def __init__(self, class_type: type[BaseModel]):
+        self.class_type = class_type
+        self.adapter = TypeAdapter(
+            create_model(
+                f"{class_type.__name__}Envelope",
+                __base__=class_type,
+                detail=(str | None, None),
+            )
+        )
+
+    def decode(self, data: bytes | dict) -> tuple[bool, Any]:
+        # バッチ API の結果は解析済みの dict で渡される
+        try:
+            if isinstance(data, dict):
+                envelope = self.adapter.validate_python(data)
+            else:
+                envelope = self.adapter.validate_json(data)
+        except ValidationError:
+            if isinstance(data, bytes):
+                data = data.decode(errors="replace")
+            return False, f"failed convert response to class : {data}"
+        fields_set = envelope.model_fields_set
+        if envelope.detail is not None and fields_set == {"detail"}:
+            return False, ErrorMsg(detail=envelope.detail)
+        return True, self.class_type.model_construct(
+            _fields_set=fields_set - {"detail"},
+            **{name: getattr(envelope, name) for name in self.class_type.model_fields},
+        )
+
+
+search_decoder = ResponseDecoder(SearchResponse)
+info_decoder = ResponseDecoder(InfoResponse)
 
 
 async def _get_search_result(apiurlname: APIURLName, data: dict, timeout: float):
+    """Return (ok, msg, body). body is the response bytes, validated later."""
     apiopt = APIPathOptionFactory().create(apiurlname=apiurlname)
     api_url = create_api_url(apiopt=apiopt)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        try:
-            match apiopt.method.lower():
-                case "post":
-                    res = await client.post(api_url, json=data)
-                case _:
-                    raise ValueError(f"no support method, {apiopt.method.lower()}")
-            res.raise_for_status()
-        except Exception as e:
-            return False, f"failed to api, type:{type(e).__name__}, {e}", None
-    res_json = res.json()
-    if not isinstance(res_json, dict):
-        return False, f"invalid type response, type:{type(res_json)}, {res_json}", None
-    return True, "", res_json
-
-
-async def _convert_to_response_model(data: dict, class_type: type):
+    client = get_client()
     try:
-        result = class_type(**data)
+        match apiopt.method.lower():
+            case "post":
+                res = await client.post(api_url, json=data, timeout=timeout)
+            case _:
+                raise ValueError(f"no support method, {apiopt.method.lower()}")
+        res.raise_for_status()
     except Exception as e:
-        try:
-            result = ErrorMsg(**data)
-            return False, result
-        except Exception as e2:
-            return False, f"failed convert response to class : {data}"
+        return False, APIError.from_exception(e), None
+    return True, "", res.content
+
+
+def _convert_to_response_model(data: bytes | dict, decoder: ResponseDecoder):
+    ok, result = decoder.decode(data)
+    if not ok:
+        if isinstance(result, ErrorMsg):
+            return False, result.detail
+        return False, result
+    if result.error_msg:
+        return False, result.error_msg
     return True, result
 
 
 async def _get_request_timeout(sitename: str, top_key: str = "get_data") -> float:
-    get_data_opt = read_config.get_api_options().model_dump()[top_key]
-    if get_data_opt.get(sitename) and get_data_opt[sitename].get("timeout"):
-        return get_data_opt[sitename]["timeout"]
-    return get_data_opt["timeout"]
+    apiopt = getattr(read_config.get_api_options(), top_key)
+    siteopt = getattr(apiopt, sitename, None)
+    if isinstance(siteopt, read_config.APISiteOption) and siteopt.timeout:
+        return siteopt.timeout
+    return apiopt.timeout
 
 
 async def get_search_info(inforeq: InfoRequest):
@@ -55,41 +109,130 @@ async def get_search_info(inforeq: InfoRequest):
     )
     if not ok:
         return ok, msg
-    convert_ok, convert_result = await _convert_to_response_model(
-        data=result, class_type=InfoResponse
+    return _convert_to_response_model(data=result, decoder=info_decoder)
+
+
+async def _send_search(data: dict, timeout: float):
+    return await _get_search_result(
+        apiurlname=APIURLName.SEARCH, data=data, timeout=timeout
     )
-    if not convert_ok:
-        if isinstance(convert_result, str):
-            return False, convert_result
-        if isinstance(convert_result, ErrorMsg):
-            return False, convert_result.detail
-        return False, convert_result
-    if not isinstance(convert_result, InfoResponse):
-        return False, convert_result
-    if convert_result.error_msg:
-        return False, convert_result.error_msg
-    return True, convert_result
-
-
-async def get_search(searchreq: SearchRequest):
-    ok, msg, result = await _get_search_result(
-        apiurlname=APIURLName.SEARCH,
-        data=searchreq.model_dump(mode="json"),
-        timeout=await _get_request_timeout(sitename=searchreq.sitename),
+
+
+async def _send_search_or_batch(sitename: str, data: dict, timeout: float):
+    batchopts = read_config.get_api_options().get_data.batch
+    if not batchopts.enable or sitename in batchopts.exclude_sites:
+        return await _send_search(data=data, timeout=timeout)
+    return await search_batcher.submit(
+        key=sitename,
+        data=data,
+        timeout=timeout,
+        opts=batchopts,
+        send_one=lambda data, timeout: _send_search(data=data, timeout=timeout),
+    )
+
+
+async def _get_search(searchreq: SearchRequest):
+    data = searchreq.model_dump(mode="json")
+    timeout = await _get_request_timeout(sitename=searchreq.sitename)
+    ok, msg, result = await search_hedger.run(
+        key=searchreq.sitename,
+        func=lambda: _send_search_or_batch(
+            sitename=searchreq.sitename, data=data, timeout=timeout
+        ),
+        is_success=lambda res: res[0],
+        opts=read_config.get_api_options().get_data.hedging,
     )
     if not ok:
         return ok, msg
-    convert_ok, convert_result = await _convert_to_response_model(
-        data=result, class_type=SearchResponse
+    return _convert_to_response_model(data=result, decoder=search_decoder)
+
+
+async def _get_cached_search(searchreq: SearchRequest, opts) -> SearchResponse | None:
+    try:
+        value = await search_cache.get(searchreq=searchreq, opts=opts)
+        if value is None:
+            return None
+        return SearchResponse.model_validate_json(value)
+    except Exception:
+        # キャッシュが使えない場合は API から取得する
+        return None
+
+
+async def _get_search_and_cache(searchreq: SearchRequest, use_cache: bool):
+    ok, result = await _get_search(searchreq=searchreq)
+    opts = read_config.get_api_options().get_data.cache
+    if use_cache and opts.enable and ok and isinstance(result, SearchResponse):
+        try:
+            await search_cache.set(
+                searchreq=searchreq, value=result.model_dump_json(), opts=opts
+            )
+        except Exception:
+            pass
+    return ok, result
+
+
+async def get_search(searchreq: SearchRequest, use_cache: bool = True):
+    """
+    Search with external_search.
+
+    Successful responses are cached by the normalized request. Pass
+    use_cache=False to always call the API without reading or storing the cache.
+    """
+    opts = read_config.get_api_options().get_data.cache
+    if use_cache and opts.enable:
+        cached = await _get_cached_search(searchreq=searchreq, opts=opts)
+        if cached is not None:
+            return True, cached
+    # 同じ条件の検索が同時に行われた場合は API 呼び出しを 1 回にまとめる
+    shared, (ok, result) = await search_flight.do(
+        key=create_search_key(searchreq),
+        func=lambda: _get_search_and_cache(searchreq=searchreq, use_cache=use_cache),
     )
-    if not convert_ok:
-        if isinstance(convert_result, str):
-            return False, convert_result
-        if isinstance(convert_result, ErrorMsg):
-            return False, convert_result.detail
-        return False, convert_result
-    if not isinstance(convert_result, SearchResponse):
-        return False, convert_result
-    if convert_result.error_msg:
-        return False, convert_result.error_msg
-    return True, convert_result
+    if shared and isinstance(result, SearchResponse):
+        return ok, result.model_copy(deep=True)
+    return ok, result
+
+
+async def get_search_batch(searchreqs: list[SearchRequest], use_cache: bool = True):
+    """
+    Search with several requests and return (ok, result) in the same order.
+
+    With the batch option, the requests are sent in batch calls of up to
+    max_batch_size when the API supports it.
+    """
+    return await asyncio.gather(
+        *[
+            get_search(searchreq=searchreq, use_cache=use_cache)
+            for searchreq in searchreqs
+        ]
+    )
+
+
+async def get_search_stream(
+    searchreq: SearchRequest,
+    handle: Callable[[list[SearchResult]], Awaitable[None]],
+    chunk_size: int,
+) -> tuple[bool, str]:
+    """
+    Search and pass the results to handle() in chunks of up to chunk_size,
+    parsing them as the response arrives.
+
+    This does not use the cache, single-flight, hedging or batch calls of
+    get_search. Results already passed to handle() are not taken back when an
+    error is found later in the response.
+    """
+    return await stream_search(
+        searchreq=searchreq,
+        handle=handle,
+        timeout=await _get_request_timeout(sitename=searchreq.sitename),
+        chunk_size=chunk_size,
+    )
+
+
+def get_search_stats() -> dict:
+    return {
+        "singleflight": search_flight.stats(),
+        "hedging": search_hedger.stats(),
+        "cache": search_cache.stats(),
+        "batch": search_batcher.stats(),
+    }
@@ -0,0 +1,120 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from common import read_config
+
+LATENCY_WINDOW = 100
+
+
+class LatencyTracker:
+    def __init__(self, maxlen: int = LATENCY_WINDOW):
+        self._latencies: deque[float] = deque(maxlen=maxlen)
+
+    def add(self, latency: float):
+        self._latencies.append(latency)
+
+    def percentile(self, p: float, min_samples: int) -> float | None:
+        if len(self._latencies) < max(min_samples, 1):
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[max(math.ceil(len(ordered) * p) - 1, 0)]
+
+
+class Hedger:
+    """
+    Hedged requests per site.
+
+    When a call has not finished within the site's observed latency percentile,
+    a duplicate call is started and the first successful result is used.
+    Duplicates are limited to max_extra_ratio of all calls.
+    """
+
+    requests: int
+    fired: int
+    won: int
+
+    def __init__(self):
+        self.trackers: dict[str, LatencyTracker] = {}
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+
+    def _get_tracker(self, key: str) -> LatencyTracker:
+        if key not in self.trackers:
+            self.trackers[key] = LatencyTracker()
+        return self.trackers[key]
+
+    def get_delay(self, key: str, opts: read_config.HedgingOptions) -> float | None:
+        if not opts.enable or key in opts.exclude_sites:
+            return None
+        delay = self._get_tracker(key).percentile(
+            p=opts.percentile, min_samples=opts.min_samples
+        )
+        if delay is None:
+            return None
+        return max(delay, opts.min_delay)
+
+    def _has_budget(self, opts: read_config.HedgingOptions) -> bool:
+        return self.fired < self.requests * opts.max_extra_ratio
+
+    async def run(
+        self,
+        key: str,
+        func: Callable[[], Awaitable[Any]],
+        is_success: Callable[[Any], bool],
+        opts: read_config.HedgingOptions,
+    ):
+        self.requests += 1
+        start = time.monotonic()
+        delay = self.get_delay(key=key, opts=opts)
+        if delay is None:
+            result = await func()
+            self._get_tracker(key).add(time.monotonic() - start)
+            return result
+
+        primary = asyncio.ensure_future(func())
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self._has_budget(opts):
+                result = await primary
+                self._get_tracker(key).add(time.monotonic() - start)
+                return result
+
+            self.fired += 1
+            hedge = asyncio.ensure_future(func())
+            winner = await _wait_first_success(
+                tasks=[primary, hedge], is_success=is_success
+            )
+            if winner is hedge:
+                self.won += 1
+            self._get_tracker(key).add(time.monotonic() - start)
+            return winner.result()
+        finally:
+            if not primary.done():
+                primary.cancel()
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "fired": self.fired, "won": self.won}
+
+
+async def _wait_first_success(
+    tasks: list[asyncio.Future], is_success: Callable[[Any], bool]
+) -> asyncio.Future:
+    pending = set(tasks)
+    last = tasks[0]
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in sorted(done, key=tasks.index):
+                if task.exception() is None and is_success(task.result()):
+                    return task
+                last = task
+        return last
+    finally:
+        for task in pending:
+            task.cancel()
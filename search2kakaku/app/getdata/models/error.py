@@ -1,5 +1,51 @@
+import asyncio
+
+import httpx
 from pydantic import BaseModel
 
+from common.enums import AutoUpperName, auto
+
 
 class ErrorMsg(BaseModel):
     detail: str
+
+
+class APIErrorKind(AutoUpperName):
+    TIMEOUT = auto()
+    TRANSPORT = auto()
+    HTTP_STATUS = auto()
+    OTHER = auto()
+
+
+class APIError(str):
+    """
+    Message of a failed call to the search API.
+
+    It is a str, so callers that show or save the message are unchanged, and
+    carries the kind of the failure and the HTTP status for callers that
+    decide by them, such as the circuit breaker.
+    """
+
+    kind: str
+    status_code: int | None
+
+    def __new__(cls, msg: str, kind: APIErrorKind, status_code: int | None = None):
+        error = super().__new__(cls, msg)
+        error.kind = kind.name
+        error.status_code = status_code
+        return error
+
+    @classmethod
+    def from_exception(cls, e: Exception) -> "APIError":
+        msg = f"failed to api, type:{type(e).__name__}, {e}"
+        if isinstance(e, (httpx.TimeoutException, asyncio.TimeoutError)):
+            return cls(msg, kind=APIErrorKind.TIMEOUT)
+        if isinstance(e, httpx.HTTPStatusError):
+            return cls(
+                msg,
+                kind=APIErrorKind.HTTP_STATUS,
+                status_code=e.response.status_code,
+            )
+        if isinstance(e, httpx.TransportError):
+            return cls(msg, kind=APIErrorKind.TRANSPORT)
+        return cls(msg, kind=APIErrorKind.OTHER)
@@ -0,0 +1,45 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Share one in-flight call between concurrent callers with the same key.
+
+    The first caller starts the call and later callers wait for the same task.
+    The task is shielded, so a cancelled caller does not cancel it for the others.
+    """
+
+    calls: int
+    shared: int
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    async def do(
+        self, key: str, func: Callable[[], Awaitable[Any]]
+    ) -> tuple[bool, Any]:
+        """Return (shared, result). shared is True when joining another call."""
+        task = self._tasks.get(key)
+        # Celery はタスク毎にイベントループを作り直すため、別ループのタスクは使わない
+        if task and task.get_loop() is asyncio.get_running_loop():
+            self.shared += 1
+            return True, await asyncio.shield(task)
+        task = asyncio.ensure_future(func())
+        self._tasks[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        self.calls += 1
+        return False, await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "in_flight": len(self._tasks),
+        }
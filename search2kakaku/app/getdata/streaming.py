@@ -0,0 +1,180 @@
+import codecs
+import json
+from typing import Any, Awaitable, Callable
+
+from pydantic import TypeAdapter, ValidationError
+
+from .client import get_client
+from .factory import APIPathOptionFactory
+from .enums import APIURLName
+from .util import create_api_url
+from .models.error import APIError
+from .models.search import SearchRequest, SearchResult
+
+RESULTS_KEY = "results"
+WHITESPACE = " \t\n\r"
+NUMBER_END = WHITESPACE + ",]}"
+
+_decoder = json.JSONDecoder()
+_result_adapter = TypeAdapter(SearchResult)
+
+
+class StreamParseError(ValueError):
+    pass
+
+
+class SearchResultStreamParser:
+    """
+    Incremental parser of a search response.
+
+    feed() takes the body in chunks and returns the items of the top-level
+    "results" array that are complete so far. Other top-level fields are kept
+    in `fields`. Only the unparsed part of the body is kept in memory.
+    """
+
+    fields: dict[str, Any]
+
+    def __init__(self):
+        self.fields = {}
+        self._buf = ""
+        self._state = "start"
+        self._key: str | None = None
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+
+    def _skip(self, chars: str, pos: int) -> int:
+        while pos < len(self._buf) and self._buf[pos] in chars:
+            pos += 1
+        return pos
+
+    def _decode_value(self, pos: int, final: bool) -> tuple[Any, int] | None:
+        try:
+            value, end = _decoder.raw_decode(self._buf, pos)
+        except json.JSONDecodeError as e:
+            if final:
+                raise StreamParseError(f"invalid json, {e}") from e
+            return None
+        # 数値は続きが届いていない可能性があるため、区切りを確認してから確定する
+        if (
+            isinstance(value, (int, float))
+            and not isinstance(value, bool)
+            and not final
+            and (end >= len(self._buf) or self._buf[end] not in NUMBER_END)
+        ):
+            return None
+        return value, end
+
+    def _parse(self, final: bool) -> list[dict]:
+        items = []
+        pos = 0
+        while True:
+            pos = self._skip(WHITESPACE, pos)
+            if pos >= len(self._buf):
+                break
+            char = self._buf[pos]
+            match self._state:
+                case "start":
+                    if char != "{":
+                        raise StreamParseError(f"response is not an object, {char}")
+                    pos += 1
+                    self._state = "key"
+                case "key":
+                    if char == ",":
+                        pos += 1
+                        continue
+                    if char == "}":
+                        pos += 1
+                        self._state = "end"
+                        continue
+                    decoded = self._decode_value(pos, final=final)
+                    if decoded is None:
+                        break
+                    key, end = decoded
+                    colon = self._skip(WHITESPACE, end)
+                    if colon >= len(self._buf):
+                        break
+                    if self._buf[colon] != ":":
+                        raise StreamParseError(f"invalid json, expected ':' at {key}")
+                    self._key = key
+                    pos = colon + 1
+                    self._state = "value"
+                case "value":
+                    if self._key == RESULTS_KEY and char == "[":
+                        pos += 1
+                        self._state = "results"
+                        continue
+                    decoded = self._decode_value(pos, final=final)
+                    if decoded is None:
+                        break
+                    self.fields[self._key], pos = decoded
+                    self._state = "key"
+                case "results":
+                    if char == ",":
+                        pos += 1
+                        continue
+                    if char == "]":
+                        pos += 1
+                        self._state = "key"
+                        continue
+                    decoded = self._decode_value(pos, final=final)
+                    if decoded is None:
+                        break
+                    item, pos = decoded
+                    items.append(item)
+                case _:  # end
+                    raise StreamParseError("data after the end of the response")
+        self._buf = self._buf[pos:]
+        return items
+
+    def feed(self, data: bytes) -> list[dict]:
+        self._buf += self._utf8.decode(data)
+        return self._parse(final=False)
+
+    def close(self) -> list[dict]:
+        self._buf += self._utf8.decode(b"", final=True)
+        items = self._parse(final=True)
+        if self._state != "end":
+            raise StreamParseError("response ended before the end of the object")
+        return items
+
+
+async def stream_search(
+    searchreq: SearchRequest,
+    handle: Callable[[list[SearchResult]], Awaitable[None]],
+    timeout: float,
+    chunk_size: int,
+) -> tuple[bool, str]:
+    apiopt = APIPathOptionFactory().create(apiurlname=APIURLName.SEARCH)
+    api_url = create_api_url(apiopt=apiopt)
+    parser = SearchResultStreamParser()
+    chunk: list[SearchResult] = []
+
+    async def _add(items: list[dict]):
+        nonlocal chunk
+        for item in items:
+            chunk.append(_result_adapter.validate_python(item))
+            if len(chunk) >= chunk_size:
+                await handle(chunk)
+                chunk = []
+
+    try:
+        async with get_client().stream(
+            apiopt.method.upper(),
+            api_url,
+            json=searchreq.model_dump(mode="json"),
+            timeout=timeout,
+        ) as res:
+            res.raise_for_status()
+            async for data in res.aiter_bytes():
+                await _add(parser.feed(data))
+        await _add(parser.close())
+    except (StreamParseError, ValidationError) as e:
+        return False, f"failed convert response to class, type:{type(e).__name__}, {e}"
+    except Exception as e:
+        return False, APIError.from_exception(e)
+    if chunk:
+        await handle(chunk)
+    if parser.fields.get("detail"):
+        return False, str(parser.fields["detail"])
+    if parser.fields.get("error_msg"):
+        return False, str(parser.fields["error_msg"])
+    return True, ""
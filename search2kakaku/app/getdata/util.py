@@ -1,6 +1,10 @@
+import json
 import os
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
 from common.read_config import get_api_options
 from .models.apioption import APIPathOption
+from .models.search import SearchRequest
 
 
 def get_api_base_url():
@@ -11,3 +15,35 @@ def get_api_base_url():
 def create_api_url(apiopt: APIPathOption):
     base_url = get_api_base_url()
     return os.path.join(base_url, apiopt.path)
+
+
+def normalize_url(url: str) -> str:
+    url = url.strip()
+    if not url:
+        return url
+    # ホストは別のサイトの場合がある (www.sofmap.com と a.sofmap.com) ため、大文字小文字のみ揃える
+    parts = urlsplit(url)
+    netloc = parts.netloc.lower()
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path, query, ""))
+
+
+def create_search_key(searchreq: SearchRequest) -> str:
+    """
+    Return the key of a search that gives the same result.
+
+    Used by both the single-flight and the search cache, so equivalent
+    requests (surrounding spaces, empty options, case of the host, query order)
+    share one request and one cache entry.
+    """
+    options = {k: v for k, v in searchreq.options.items() if v is not None}
+    return json.dumps(
+        {
+            "sitename": searchreq.sitename.strip().lower(),
+            "search_keyword": (searchreq.search_keyword or "").strip(),
+            "url": normalize_url(searchreq.url or ""),
+            "options": options,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
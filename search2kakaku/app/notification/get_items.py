@@ -61,10 +61,9 @@ async def get_items_by_url_with_api(
 
     results: list[KakakuURLtoItem] = []
     err_msgs: list[str] = []
+    timeout = read_config.get_api_options().post_data.timeout
     for url in urls:
-        ok, msg, response = await get_items_with_api_url(
-            url=url, timeout=read_config.get_api_options().post_data.timeout
-        )
+        ok, msg, response = await get_items_with_api_url(url=url, timeout=timeout)
 
         if response and response.items:
             item_list = [
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from domain.models.pricelog import pricelog as m_pricelog, command as p_cmd
+from databases.sql.pricelog import repository as p_repo
+from app.getdata import get_search_info
+from app.getdata.models import info as info_model
+from app.enums import SiteName, SupportDomain
+from common import read_config
+
+
+def get_entity_type(is_akiba: bool) -> str:
+    if is_akiba:
+        return SupportDomain.A_SOFMAP.value
+    return SupportDomain.SOFMAP.value
+
+
+def _to_utc(dt: datetime) -> datetime:
+    # SQLite から読み込んだ日時はタイムゾーン情報を持たない
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def _is_fresh(db_cates: list[m_pricelog.Category], ttl: float) -> bool:
+    if not db_cates:
+        return False
+    fetched_at = min(_to_utc(db_cate.updated_at) for db_cate in db_cates)
+    return datetime.now(timezone.utc) - fetched_at < timedelta(seconds=ttl)
+
+
+async def _get_cached_categories(
+    ses: AsyncSession, entity_type: str
+) -> list[m_pricelog.Category]:
+    caterepo = p_repo.CategoryRepository(ses=ses)
+    return list(
+        await caterepo.get(
+            command=p_cmd.CategoryGetCommand(entity_type=entity_type, is_deleted=False)
+        )
+    )
+
+
+async def fetch_category_list(is_akiba: bool) -> list[info_model.CategoryInfo]:
+    inforeq = info_model.InfoRequest(
+        sitename=SiteName.SOFMAP.value,
+        infoname="category",
+        options={"is_akiba": is_akiba},
+    )
+    ok, result = await get_search_info(inforeq=inforeq)
+    if ok and isinstance(result, info_model.InfoResponse):
+        return result.results
+    return []
+
+
+async def refresh_categories(
+    ses: AsyncSession, is_akiba: bool, log=None
+) -> list[m_pricelog.Category]:
+    """
+    Fetch the category list from the API and save it to the Category table.
+
+    Categories no longer returned are marked as deleted. When the API returns
+    nothing, the saved categories are kept as they are.
+    """
+    entity_type = get_entity_type(is_akiba=is_akiba)
+    results = await fetch_category_list(is_akiba=is_akiba)
+    if not results:
+        if log:
+            log.warning("failed to get category list", entity_type=entity_type)
+        return []
+    gids = {r.gid for r in results}
+    for db_cate in await _get_cached_categories(ses=ses, entity_type=entity_type):
+        if db_cate.category_id not in gids:
+            db_cate.is_deleted = True
+    caterepo = p_repo.CategoryRepository(ses=ses)
+    await caterepo.save_all(
+        cate_entries=[
+            m_pricelog.Category(category_id=r.gid, name=r.name, entity_type=entity_type)
+            for r in results
+        ]
+    )
+    if log:
+        log.info("refresh categories", entity_type=entity_type, count=len(results))
+    return await _get_cached_categories(ses=ses, entity_type=entity_type)
+
+
+async def get_categories(
+    ses: AsyncSession, is_akiba: bool, refresh: bool = False, log=None
+) -> list[m_pricelog.Category]:
+    entity_type = get_entity_type(is_akiba=is_akiba)
+    db_cates = await _get_cached_categories(ses=ses, entity_type=entity_type)
+    ttl = read_config.get_api_options().get_data.category_cache.ttl
+    if not refresh and _is_fresh(db_cates=db_cates, ttl=ttl):
+        return db_cates
+    refreshed = await refresh_categories(ses=ses, is_akiba=is_akiba, log=log)
+    # 取得に失敗した場合は古いカテゴリを使う
+    return refreshed or db_cates
+
+
+async def get_category_list(
+    ses: AsyncSession, is_akiba: bool, refresh: bool = False, log=None
+) -> list[dict]:
+    db_cates = await get_categories(
+        ses=ses, is_akiba=is_akiba, refresh=refresh, log=log
+    )
+    return [{"gid": c.category_id, "name": c.name} for c in db_cates]
+
+
+async def get_category_id(
+    ses: AsyncSession,
+    is_akiba: bool,
+    category_name: str,
+    refresh: bool = False,
+    log=None,
+) -> str:
+    if not category_name:
+        return ""
+    db_cates = await get_categories(
+        ses=ses, is_akiba=is_akiba, refresh=refresh, log=log
+    )
+    for db_cate in db_cates:
+        if db_cate.name == category_name:
+            return db_cate.category_id
+    return ""
@@ -0,0 +1,151 @@
+import math
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from domain.models.pricelog import pricelog as m_pricelog, command as p_cmd
+from databases.sql.pricelog import repository as p_repo
+from common import read_config
+
+# PriceLog rows saved by one scrape are created within this many seconds
+SNAPSHOT_GAP_SECONDS = 60
+
+
+class ChangeEstimate(NamedTuple):
+    url_id: int
+    observations: int
+    changes: int
+    rate_per_hour: float
+    age_hours: float | None
+    change_probability: float
+
+
+def _to_utc(value: datetime) -> datetime:
+    if value.tzinfo:
+        return value.astimezone(timezone.utc)
+    return value.replace(tzinfo=timezone.utc)
+
+
+def _split_snapshots(rows: list) -> list[tuple[datetime, frozenset]]:
+    snapshots: list[tuple[datetime, frozenset]] = []
+    current_at: datetime | None = None
+    current: list[tuple] = []
+    for row in rows:
+        created_at = _to_utc(row.created_at)
+        if current_at and (created_at - current_at).total_seconds() > (
+            SNAPSHOT_GAP_SECONDS
+        ):
+            snapshots.append((current_at, frozenset(current)))
+            current = []
+        current_at = created_at
+        current.append((row.price, row.stock_quantity, row.stock_msg, row.is_success))
+    if current_at:
+        snapshots.append((current_at, frozenset(current)))
+    return snapshots
+
+
+def estimate_change(
+    url_id: int,
+    snapshots: list[tuple[datetime, frozenset]],
+    now: datetime,
+    last_seen: datetime | None = None,
+    seen_count: int = 0,
+) -> ChangeEstimate:
+    if not snapshots:
+        return ChangeEstimate(
+            url_id=url_id,
+            observations=0,
+            changes=0,
+            rate_per_hour=0.0,
+            age_hours=None,
+            change_probability=1.0,
+        )
+    changes = sum(
+        1
+        for (_, before), (_, after) in zip(snapshots, snapshots[1:])
+        if before != after
+    )
+    observations = max(len(snapshots), seen_count)
+    last_observed_at = snapshots[-1][0]
+    # 変化がない場合は PriceLog を保存しないため、最後に取得した日時で補う
+    if last_seen and _to_utc(last_seen) > last_observed_at:
+        last_observed_at = _to_utc(last_seen)
+        observations = max(len(snapshots) + 1, seen_count)
+    span_hours = (last_observed_at - snapshots[0][0]).total_seconds() / 3600
+    # +0.5 / +1 で観測が少ない場合に変化率 0 と見なさないようにする
+    rate = (changes + 0.5) / (span_hours + 1)
+    age_hours = max((now - last_observed_at).total_seconds() / 3600, 0.0)
+    return ChangeEstimate(
+        url_id=url_id,
+        observations=observations,
+        changes=changes,
+        rate_per_hour=rate,
+        age_hours=age_hours,
+        change_probability=1 - math.exp(-rate * age_hours),
+    )
+
+
+def create_history_stmt(url_ids: list[int], since: datetime):
+    return (
+        select(
+            m_pricelog.PriceLog.url_id,
+            m_pricelog.PriceLog.created_at,
+            m_pricelog.PriceLog.price,
+            m_pricelog.PriceLog.stock_quantity,
+            m_pricelog.PriceLog.stock_msg,
+            m_pricelog.PriceLog.is_success,
+        )
+        .where(m_pricelog.PriceLog.url_id.in_(url_ids))
+        .where(m_pricelog.PriceLog.created_at >= since)
+        .order_by(m_pricelog.PriceLog.url_id, m_pricelog.PriceLog.created_at)
+    )
+
+
+async def get_change_estimates(
+    ses: AsyncSession, url_ids: list[int], history_days: int
+) -> dict[int, ChangeEstimate]:
+    now = datetime.now(timezone.utc)
+    stmt = create_history_stmt(
+        url_ids=url_ids, since=now - timedelta(days=history_days)
+    )
+    rows_by_url: dict[int, list] = {url_id: [] for url_id in url_ids}
+    for row in (await ses.execute(stmt)).all():
+        rows_by_url[row.url_id].append(row)
+    db_digests = {
+        db_digest.url_id: db_digest
+        for db_digest in await p_repo.ScrapeDigestRepository(ses=ses).get(
+            command=p_cmd.ScrapeDigestGetCommand(url_ids=url_ids)
+        )
+    }
+    return {
+        url_id: estimate_change(
+            url_id=url_id,
+            snapshots=_split_snapshots(rows),
+            now=now,
+            last_seen=db_digests[url_id].updated_at if url_id in db_digests else None,
+            seen_count=db_digests[url_id].seen_count if url_id in db_digests else 0,
+        )
+        for url_id, rows in rows_by_url.items()
+    }
+
+
+def select_url_ids_to_scrape(
+    estimates: dict[int, ChangeEstimate],
+    opts: read_config.PrioritizationOptions,
+) -> tuple[list[int], list[int]]:
+    selected: list[ChangeEstimate] = []
+    skipped: list[int] = []
+    for estimate in estimates.values():
+        if (
+            estimate.observations < opts.min_observations
+            or estimate.age_hours is None
+            or estimate.age_hours >= opts.max_age_hours
+            or estimate.change_probability >= opts.min_change_probability
+        ):
+            selected.append(estimate)
+            continue
+        skipped.append(estimate.url_id)
+    selected.sort(key=lambda e: e.change_probability, reverse=True)
+    return [e.url_id for e in selected], skipped
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from domain.models.activitylog import (
+    command as act_cmd,
+    enums as act_enums,
+    activitylog as m_actlog,
+)
+from databases.sql import util as db_util
+from databases.sql.activitylog import repository as a_repo
+from app.activitylog.update import UpdateActivityLog
+from . import constants as update_const
+
+CHECKPOINT_TARGET_TABLE = "ActivityLog"
+
+
+def _create_checkpoint(
+    run_activitylog_id: int, result: dict, caller_type: str | None = None
+) -> m_actlog.ActivityLog:
+    if result["ok"]:
+        status = act_enums.UpdateStatus.COMPLETED.name
+    else:
+        status = act_enums.UpdateStatus.FAILED.name
+    return m_actlog.ActivityLog(
+        target_id=str(run_activitylog_id),
+        target_table=CHECKPOINT_TARGET_TABLE,
+        activity_type=update_const.SCRAPING_URL_CHECKPOINT_ACTIVITY_TYPE,
+        current_state=status,
+        caller_type=caller_type or "",
+        meta={"url_id": result["url_id"]},
+        error_msg="" if result["ok"] else result.get("msg", ""),
+    )
+
+
+async def save_checkpoints(
+    run_activitylog_id: int, results: list[dict], caller_type: str | None = None
+):
+    if not results:
+        return
+    async for ses in db_util.get_async_session():
+        actlogrepo = a_repo.ActivityLogRepository(ses=ses)
+        await actlogrepo.save_all(
+            [
+                _create_checkpoint(
+                    run_activitylog_id=run_activitylog_id,
+                    result=result,
+                    caller_type=caller_type,
+                )
+                for result in results
+            ]
+        )
+
+
+async def get_checkpoint_results(
+    ses: AsyncSession, run_activitylog_id: int
+) -> dict[int, dict]:
+    upactlog = UpdateActivityLog(ses=ses)
+    db_actlogs = await upactlog.get_all(
+        command=act_cmd.ActivityLogGetCommand(
+            target_id=run_activitylog_id,
+            target_table=CHECKPOINT_TARGET_TABLE,
+            activity_types=[update_const.SCRAPING_URL_CHECKPOINT_ACTIVITY_TYPE],
+        )
+    )
+    results: dict[int, dict] = {}
+    for db_actlog in sorted(db_actlogs, key=lambda log: log.id):
+        url_id = db_actlog.meta.get("url_id")
+        if url_id is None:
+            continue
+        results[url_id] = {
+            "url_id": url_id,
+            "ok": db_actlog.current_state == act_enums.UpdateStatus.COMPLETED.name,
+            "msg": db_actlog.error_msg,
+        }
+    return results
+
+
+async def prune_checkpoints(ses: AsyncSession, retention_days: int, log=None) -> int:
+    """
+    Delete the checkpoints older than retention_days and return the count.
+
+    Checkpoints are only read to resume a run and to count today's Gemini
+    scrapes, so a run older than the retention is resumed from the beginning.
+    """
+    actlogrepo = a_repo.ActivityLogRepository(ses=ses)
+    deleted = await actlogrepo.delete(
+        command=act_cmd.ActivityLogDeleteCommand(
+            activity_types=[update_const.SCRAPING_URL_CHECKPOINT_ACTIVITY_TYPE],
+            updated_at_end=datetime.now(timezone.utc) - timedelta(days=retention_days),
+        )
+    )
+    if log and deleted:
+        log.info("prune checkpoints", deleted=deleted, retention_days=retention_days)
+    return deleted
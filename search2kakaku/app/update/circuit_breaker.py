@@ -0,0 +1,148 @@
+import time
+from datetime import datetime, timezone
+from enum import auto
+
+from pydantic import BaseModel
+
+from app.getdata.models.error import APIErrorKind
+from common import read_config
+from common.enums import AutoUpperName
+
+SITE_FAILURE_STATUS_CODES = {429}
+
+
+def is_site_failure(res: dict) -> bool:
+    """
+    Return True when a scrape result means the site or the API is unhealthy:
+    a transport error, a timeout, a 5xx or 429 response.
+
+    Errors of the URL itself (not found, no result, a 4xx response) mean the
+    site answered, so they do not count as failures of the circuit breaker.
+    The kind and status are set from the APIError of the failed call.
+    """
+    match res.get("error_kind"):
+        case APIErrorKind.TIMEOUT.name | APIErrorKind.TRANSPORT.name:
+            return True
+        case APIErrorKind.HTTP_STATUS.name:
+            code = res.get("status_code") or 0
+            return code >= 500 or code in SITE_FAILURE_STATUS_CODES
+        case _:
+            return False
+
+
+class CircuitState(AutoUpperName):
+    CLOSED = auto()
+    OPEN = auto()
+    HALF_OPEN = auto()
+
+
+class CircuitBreakerState(BaseModel):
+    state: str = CircuitState.CLOSED.name
+    failures: int = 0
+    # epoch seconds, so the state can be passed between Celery tasks
+    opened_at: float = 0.0
+    probing: bool = False
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one site.
+
+    Opens after `failure_threshold` consecutive failures and rejects calls until
+    `cooldown` seconds have passed. Then one probe call is allowed (HALF_OPEN):
+    success closes the circuit and failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        opts: read_config.CircuitBreakerOptions,
+        state: CircuitBreakerState | None = None,
+    ):
+        self.name = name
+        self.opts = opts
+        self.state = state.model_copy() if state else CircuitBreakerState()
+        self.state.probing = False
+        self.events: list[dict] = []
+
+    def _transition(self, to: CircuitState):
+        if self.state.state == to.name:
+            return
+        self.events.append(
+            {
+                "site": self.name,
+                "from": self.state.state,
+                "to": to.name,
+                "failures": self.state.failures,
+                "at": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+        self.state.state = to.name
+        if to == CircuitState.OPEN:
+            self.state.opened_at = time.time()
+
+    def is_open(self) -> bool:
+        return (
+            self.state.state == CircuitState.OPEN.name
+            and time.time() - self.state.opened_at < self.opts.cooldown
+        )
+
+    def allow(self) -> bool:
+        match self.state.state:
+            case CircuitState.CLOSED.name:
+                return True
+            case CircuitState.OPEN.name:
+                if time.time() - self.state.opened_at < self.opts.cooldown:
+                    return False
+                self._transition(CircuitState.HALF_OPEN)
+                self.state.probing = True
+                return True
+            case _:  # HALF_OPEN
+                if self.state.probing:
+                    return False
+                self.state.probing = True
+                return True
+
+    def record(self, ok: bool):
+        if ok:
+            self.state.failures = 0
+            self.state.probing = False
+            self._transition(CircuitState.CLOSED)
+            return
+        self.state.failures += 1
+        if self.state.state == CircuitState.HALF_OPEN.name:
+            self.state.probing = False
+            self._transition(CircuitState.OPEN)
+            return
+        if self.state.failures >= self.opts.failure_threshold:
+            self._transition(CircuitState.OPEN)
+
+
+class CircuitBreakers:
+    def __init__(
+        self,
+        opts: read_config.CircuitBreakerOptions,
+        states: dict[str, CircuitBreakerState] | None = None,
+    ):
+        self.opts = opts
+        self.breakers: dict[str, CircuitBreaker] = {
+            name: CircuitBreaker(name=name, opts=opts, state=state)
+            for name, state in (states or {}).items()
+        }
+
+    def get(self, name: str) -> CircuitBreaker:
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(name=name, opts=self.opts)
+        return self.breakers[name]
+
+    def is_open(self, name: str | None) -> bool:
+        if name not in self.breakers:
+            return False
+        return self.breakers[name].is_open()
+
+    def states(self) -> dict[str, CircuitBreakerState]:
+        return {name: breaker.state for name, breaker in self.breakers.items()}
+
+    def events(self) -> list[dict]:
+        events = [event for b in self.breakers.values() for event in b.events]
+        return sorted(events, key=lambda event: event["at"])
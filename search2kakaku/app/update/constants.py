@@ -2,3 +2,6 @@ OK_WAIT_TIME = 2
 NG_WAIT_TIME = 4
 
 SCRAPING_URL_ACTIVITY_TYPE = "scraping_and_save_target_urls"
+SCRAPING_URL_CHECKPOINT_ACTIVITY_TYPE = "scraping_url_checkpoint"
+GEMINI_LANE_ACTIVITY_TYPE = "scraping_gemini_urls"
+GEMINI_LANE_STALE_HOURS = 24
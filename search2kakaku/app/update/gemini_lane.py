@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from domain.models.activitylog import (
+    activitylog as m_actlog,
+    command as act_cmd,
+    enums as act_enums,
+)
+from app.activitylog.update import UpdateActivityLog
+from . import constants as update_const, checkpoint
+
+
+def get_start_of_today() -> datetime:
+    now = datetime.now().astimezone()
+    return now.replace(hour=0, minute=0, second=0, microsecond=0).astimezone(
+        timezone.utc
+    )
+
+
+async def is_gemini_lane_in_progress(ses: AsyncSession) -> bool:
+    upactlog = UpdateActivityLog(ses=ses)
+    db_actlogs = await upactlog.get_all(
+        command=act_cmd.ActivityLogGetCommand(
+            activity_types=[update_const.GEMINI_LANE_ACTIVITY_TYPE],
+            current_states=[act_enums.UpdateStatus.IN_PROGRESS.name],
+            # 異常終了したレーンがいつまでも残らないように古いものは無視する
+            updated_at_start=datetime.now(timezone.utc)
+            - timedelta(hours=update_const.GEMINI_LANE_STALE_HOURS),
+        )
+    )
+    return bool(db_actlogs)
+
+
+async def count_gemini_calls_since(ses: AsyncSession, since: datetime) -> int:
+    # Gemini レーンのチェックポイント数を呼び出し回数とみなす
+    upactlog = UpdateActivityLog(ses=ses)
+    db_lanes = await upactlog.get_all(
+        command=act_cmd.ActivityLogGetCommand(
+            activity_types=[update_const.GEMINI_LANE_ACTIVITY_TYPE],
+            updated_at_start=since,
+        )
+    )
+    if not db_lanes:
+        return 0
+    stmt = (
+        select(func.count())
+        .select_from(m_actlog.ActivityLog)
+        .where(
+            m_actlog.ActivityLog.activity_type
+            == update_const.SCRAPING_URL_CHECKPOINT_ACTIVITY_TYPE
+        )
+        .where(m_actlog.ActivityLog.target_table == checkpoint.CHECKPOINT_TARGET_TABLE)
+        .where(m_actlog.ActivityLog.target_id.in_([str(lane.id) for lane in db_lanes]))
+        .where(m_actlog.ActivityLog.created_at >= since)
+    )
+    return (await ses.execute(stmt)).scalar() or 0
+
+
+async def get_remaining_quota(ses: AsyncSession, daily_quota: int) -> int | None:
+    if not daily_quota:
+        return None
+    used = await count_gemini_calls_since(ses=ses, since=get_start_of_today())
+    return max(daily_quota - used, 0)
+
+
+async def get_gemini_lanes(
+    ses: AsyncSession, run_activitylog_id: int
+) -> list[m_actlog.ActivityLog]:
+    upactlog = UpdateActivityLog(ses=ses)
+    return await upactlog.get_all(
+        command=act_cmd.ActivityLogGetCommand(
+            target_id=run_activitylog_id,
+            target_table=checkpoint.CHECKPOINT_TARGET_TABLE,
+            activity_types=[update_const.GEMINI_LANE_ACTIVITY_TYPE],
+        )
+    )
+
+
+async def cancel_gemini_lanes_in_progress(
+    ses: AsyncSession, run_activitylog_id: int, error_msg: str
+) -> list[int]:
+    """Cancel the unfinished lanes of a run and return the ids of all its lanes."""
+    db_lanes = await get_gemini_lanes(ses=ses, run_activitylog_id=run_activitylog_id)
+    lane_ids = [db_lane.id for db_lane in db_lanes]
+    in_progress_ids = [
+        db_lane.id
+        for db_lane in db_lanes
+        if db_lane.current_state == act_enums.UpdateStatus.IN_PROGRESS.name
+    ]
+    upactlog = UpdateActivityLog(ses=ses)
+    for lane_id in in_progress_ids:
+        await upactlog.canceled(id=lane_id, error_msg=error_msg)
+    return lane_ids
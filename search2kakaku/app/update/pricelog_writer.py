@@ -0,0 +1,281 @@
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from domain.models.pricelog import pricelog as m_pricelog, command as p_cmd
+from databases.sql import util as db_util
+from databases.sql.pricelog import repository as p_repo
+from common import read_config
+from . import checkpoint
+
+_FLUSH = object()
+DIGEST_FIELDS = (
+    "title",
+    "price",
+    "condition",
+    "on_sale",
+    "salename",
+    "is_success",
+    "image_url",
+    "stock_msg",
+    "point",
+    "stock_quantity",
+    "used_list_url",
+    "sub_price",
+    "others",
+)
+DIGEST_MODULUS = 2**256
+
+
+def _digest_row(pricelog: m_pricelog.PriceLogRow) -> bytes:
+    return json.dumps(
+        [pricelog[field] for field in DIGEST_FIELDS]
+        + [pricelog["url"], pricelog["shop"]],
+        ensure_ascii=False,
+        sort_keys=True,
+    ).encode()
+
+
+class DigestBuilder:
+    # 行の順序に依存せず少しずつ計算できるよう、行毎のハッシュの和を使う
+    def __init__(self):
+        self.count = 0
+        self._sum = 0
+
+    def add(self, pricelogs: list[m_pricelog.PriceLogRow]):
+        for pricelog in pricelogs:
+            row_hash = hashlib.sha256(_digest_row(pricelog)).digest()
+            self._sum = (self._sum + int.from_bytes(row_hash, "big")) % DIGEST_MODULUS
+            self.count += 1
+
+    def hexdigest(self) -> str:
+        return hashlib.sha256(f"{self.count}:{self._sum:064x}".encode()).hexdigest()
+
+
+def compute_digest(pricelogs: list[m_pricelog.PriceLogRow]) -> str:
+    builder = DigestBuilder()
+    builder.add(pricelogs)
+    return builder.hexdigest()
+
+
+class _Rows(NamedTuple):
+    """Part of the rows of a URL whose scrape is still running."""
+
+    url_id: int
+    pricelogs: list[m_pricelog.PriceLogRow]
+
+
+class _PartialURL:
+    def __init__(self):
+        self.rows: list[m_pricelog.PriceLogRow] = []
+        self.digest = DigestBuilder()
+        # 途中の行を先に保存した場合は、前回と同じでも行を保存する
+        self.spilled = False
+        self.error_msg = ""
+
+
+class _FinishedURL(NamedTuple):
+    result: dict
+    pricelogs: list[m_pricelog.PriceLogRow]
+    digest: str
+    spilled: bool
+
+
+class PriceLogWriter:
+    """
+    Single writer task for scraped PriceLog rows.
+
+    Fetchers put their result and converted rows on a bounded queue, so they wait
+    when saving falls behind. The writer saves the rows in one transaction per
+    batch and then records the checkpoints of the URLs in the batch.
+    With skip_unchanged, rows of a URL whose result set has the same digest as the
+    previous scrape are not saved; only the last seen time of the digest is updated.
+    A streaming scrape puts the rows of a URL in parts with put_rows(). When the
+    pending rows reach batch_rows before the URL finishes, they are saved early
+    and the URL is then always saved as changed. Rows saved early are kept when
+    the scrape of the URL fails afterwards.
+    """
+
+    opts: read_config.PriceLogWriterOptions
+    run_activitylog_id: int | None
+    caller_type: str | None
+    results: list[dict]
+
+    def __init__(
+        self,
+        opts: read_config.PriceLogWriterOptions,
+        run_activitylog_id: int | None = None,
+        caller_type: str | None = None,
+        log=None,
+    ):
+        self.opts = opts
+        self.run_activitylog_id = run_activitylog_id
+        self.caller_type = caller_type
+        self.log = log
+        self.results = []
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=opts.queue_size)
+        self._partials: dict[int, _PartialURL] = {}
+
+    async def put(self, result: dict, pricelogs: list[m_pricelog.PriceLogRow]):
+        await self._queue.put((result, pricelogs))
+
+    async def put_rows(self, url_id: int, pricelogs: list[m_pricelog.PriceLogRow]):
+        await self._queue.put(_Rows(url_id=url_id, pricelogs=pricelogs))
+
+    async def close(self):
+        await self._queue.put(None)
+
+    async def run(self) -> list[dict]:
+        items: list[tuple[dict, list[m_pricelog.PriceLogRow]]] = []
+        rows = 0
+        started_at = 0.0
+        closed = False
+        while not closed:
+            timeout = None
+            if rows or items:
+                timeout = max(
+                    self.opts.flush_interval - (time.monotonic() - started_at), 0
+                )
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                item = _FLUSH
+            if item is None:
+                closed = True
+            elif item is not _FLUSH:
+                if not rows and not items:
+                    started_at = time.monotonic()
+                if isinstance(item, _Rows):
+                    partial = self._partials.setdefault(item.url_id, _PartialURL())
+                    partial.rows.extend(item.pricelogs)
+                    partial.digest.add(item.pricelogs)
+                    rows += len(item.pricelogs)
+                else:
+                    items.append(item)
+                    rows += len(item[1])
+            if (rows or items) and (
+                closed or item is _FLUSH or rows >= self.opts.batch_rows
+            ):
+                await self._flush(items)
+                items = []
+                rows = 0
+        return self.results
+
+    def _finish(
+        self, items: list[tuple[dict, list[m_pricelog.PriceLogRow]]]
+    ) -> list[_FinishedURL]:
+        finished = []
+        for result, pricelogs in items:
+            partial = self._partials.pop(result["url_id"], None)
+            if partial and partial.error_msg and result["ok"]:
+                result["ok"] = False
+                result["msg"] = partial.error_msg
+            if not result["ok"]:
+                continue
+            if not partial:
+                finished.append(
+                    _FinishedURL(result, pricelogs, compute_digest(pricelogs), False)
+                )
+                continue
+            partial.digest.add(pricelogs)
+            finished.append(
+                _FinishedURL(
+                    result,
+                    partial.rows + pricelogs,
+                    partial.digest.hexdigest(),
+                    partial.spilled,
+                )
+            )
+        return finished
+
+    async def _save(
+        self,
+        ses,
+        finished: list[_FinishedURL],
+        spill_rows: list[m_pricelog.PriceLogRow],
+    ) -> tuple[int, int]:
+        now = datetime.now(timezone.utc)
+        digests = {f.result["url_id"]: f.digest for f in finished}
+        digestrepo = p_repo.ScrapeDigestRepository(ses=ses)
+        unchanged: set[int] = set()
+        if self.opts.skip_unchanged and digests:
+            spilled = {f.result["url_id"] for f in finished if f.spilled}
+            db_digests = await digestrepo.get(
+                command=p_cmd.ScrapeDigestGetCommand(url_ids=list(digests))
+            )
+            unchanged = {
+                db_digest.url_id
+                for db_digest in db_digests
+                if digests[db_digest.url_id] == db_digest.digest
+                and db_digest.url_id not in spilled
+            }
+        # 前回と同じ結果の URL は PriceLog を保存せず、取得日時のみ更新する
+        pricelogs = spill_rows + [
+            pricelog
+            for f in finished
+            if f.result["url_id"] not in unchanged
+            for pricelog in f.pricelogs
+        ]
+        if pricelogs:
+            pricelogrepo = p_repo.PriceLogRepository(ses=ses)
+            await pricelogrepo.save_rows(rows=pricelogs)
+        if digests:
+            await digestrepo.save_all(
+                [
+                    m_pricelog.ScrapeDigest(
+                        url_id=url_id, digest=digest, changed_at=now, updated_at=now
+                    )
+                    for url_id, digest in digests.items()
+                ]
+            )
+        for f in finished:
+            if f.result["url_id"] in unchanged:
+                f.result["unchanged"] = True
+        return len(pricelogs), len(unchanged)
+
+    async def _flush(self, items: list[tuple[dict, list[m_pricelog.PriceLogRow]]]):
+        results = [result for result, _ in items]
+        finished = self._finish(items)
+        # 終わっていない URL の行は先に保存してメモリから外す
+        spilled = [p for p in self._partials.values() if p.rows]
+        spill_rows = [pricelog for p in spilled for pricelog in p.rows]
+        for partial in spilled:
+            partial.rows = []
+            partial.spilled = True
+        if finished or spill_rows:
+            try:
+                async for ses in db_util.get_async_session():
+                    rows, unchanged = await self._save(
+                        ses=ses, finished=finished, spill_rows=spill_rows
+                    )
+                if self.log:
+                    self.log.info(
+                        "save pricelogs",
+                        urls=len(finished),
+                        rows=rows,
+                        unchanged=unchanged,
+                    )
+            except Exception as e:
+                if self.log:
+                    self.log.error("save pricelogs failed", urls=len(finished), error=e)
+                msg = f"failed to save, type:{type(e).__name__}, {e}"
+                for f in finished:
+                    f.result["ok"] = False
+                    f.result["msg"] = msg
+                for partial in spilled:
+                    partial.error_msg = msg
+        self.results.extend(results)
+        if not self.run_activitylog_id or not results:
+            return
+        try:
+            await checkpoint.save_checkpoints(
+                run_activitylog_id=self.run_activitylog_id,
+                results=results,
+                caller_type=self.caller_type,
+            )
+        except Exception as e:
+            if self.log:
+                self.log.error("save checkpoints failed", urls=len(items), error=e)
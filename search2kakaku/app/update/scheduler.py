@@ -0,0 +1,280 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from common import read_config
+
+DEFAULT_DOMAIN_KEY = "default"
+LATENCY_WINDOW = 20
+LATENCY_MIN_SAMPLES = 5
+
+
+class TokenBucket:
+    rate: float
+    capacity: float
+    tokens: float
+    updated_at: float
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(float(capacity), 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit with additive increase / multiplicative decrease.
+
+    The limit grows by 1 after `limit` consecutive healthy completions and is
+    halved on an error or when the p95 latency exceeds `max_p95_latency`.
+    Only requests started after the last decrease can trigger the next one,
+    so a burst of failures halves the limit once. A release with ok=None (no
+    request was sent, or the error was of the request, not of the site) only
+    frees the slot.
+    """
+
+    limit: int
+    minimum: int
+    maximum: int
+    max_p95_latency: float
+    in_flight: int
+    increases: int
+    decreases: int
+
+    def __init__(
+        self, initial: int, minimum: int, maximum: int, max_p95_latency: float
+    ):
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.max_p95_latency = max_p95_latency
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self._epoch = 0
+        self._healthy_count = 0
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._cond = asyncio.Condition()
+
+    def p95_latency(self) -> float:
+        if len(self._latencies) < LATENCY_MIN_SAMPLES:
+            return 0.0
+        ordered = sorted(self._latencies)
+        return ordered[math.ceil(len(ordered) * 0.95) - 1]
+
+    async def acquire(self) -> int:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+            return self._epoch
+
+    async def release(self, epoch: int, latency: float, ok: bool | None):
+        async with self._cond:
+            self.in_flight -= 1
+            if ok is None:
+                self._cond.notify_all()
+                return
+            self._latencies.append(latency)
+            if not ok or (
+                self.max_p95_latency > 0 and self.p95_latency() > self.max_p95_latency
+            ):
+                if epoch == self._epoch:
+                    self._decrease()
+            else:
+                self._healthy_count += 1
+                if self._healthy_count >= self.limit:
+                    self._increase()
+            self._cond.notify_all()
+
+    def _increase(self):
+        self._healthy_count = 0
+        if self.limit >= self.maximum:
+            return
+        self.limit += 1
+        self.increases += 1
+
+    def _decrease(self):
+        self._epoch += 1
+        self._healthy_count = 0
+        self._latencies.clear()
+        if self.limit <= self.minimum:
+            return
+        self.limit = max(self.minimum, self.limit // 2)
+        self.decreases += 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+def get_max_parts(limit: read_config.DomainLimitOption) -> int:
+    # 1つの分割に少なくとも1つの並列数が必要なため、最大の並列数までしか分けられない
+    if limit.adaptive:
+        return limit.max_concurrency or limit.concurrency
+    return limit.concurrency
+
+
+def split_domain_limit(
+    limit: read_config.DomainLimitOption, parts: int
+) -> read_config.DomainLimitOption:
+    """
+    Return the limit of one of `parts` schedulers running the same domain at once.
+
+    Concurrency and rate are divided so that the total of all parts stays
+    within the limit. `parts` must not exceed get_max_parts(limit).
+    """
+    if parts <= 1:
+        return limit
+    return limit.model_copy(
+        update={
+            "concurrency": max(limit.concurrency // parts, 1),
+            "rate": limit.rate / parts,
+            "burst": max(limit.burst // parts, 1),
+            "min_concurrency": max(limit.min_concurrency // parts, 1),
+            "max_concurrency": (
+                max(limit.max_concurrency // parts, 1)
+                if limit.max_concurrency
+                else None
+            ),
+        }
+    )
+
+
+class DomainScheduler:
+    """
+    Run jobs grouped by domain key.
+
+    Each domain gets its own worker pool (concurrency) and token bucket (rate),
+    so different sites run in parallel while each site keeps to its own limit.
+    With `adaptive` the pool size moves between min and max concurrency (AIMD).
+    When `parts` schedulers run the same domains at once (Celery batches), each
+    uses its share of the limits.
+    """
+
+    limits: dict[str, read_config.DomainLimitOption]
+    limiters: dict[str, AIMDLimiter]
+    parts: int
+
+    def __init__(
+        self, limits: dict[str, read_config.DomainLimitOption], parts: int = 1
+    ):
+        self.limits = limits
+        self.limiters = {}
+        self.parts = parts
+
+    def get_base_limit(self, key: str) -> read_config.DomainLimitOption:
+        if key in self.limits:
+            return self.limits[key]
+        if DEFAULT_DOMAIN_KEY in self.limits:
+            return self.limits[DEFAULT_DOMAIN_KEY]
+        return read_config.DomainLimitOption()
+
+    def get_limit(self, key: str) -> read_config.DomainLimitOption:
+        return split_domain_limit(self.get_base_limit(key), parts=self.parts)
+
+    def create_limiter(self, key: str) -> AIMDLimiter:
+        limit = self.get_limit(key)
+        if not limit.adaptive:
+            return AIMDLimiter(
+                initial=limit.concurrency,
+                minimum=limit.concurrency,
+                maximum=limit.concurrency,
+                max_p95_latency=0,
+            )
+        return AIMDLimiter(
+            initial=limit.concurrency,
+            minimum=limit.min_concurrency,
+            maximum=limit.max_concurrency or limit.concurrency,
+            max_p95_latency=limit.max_p95_latency,
+        )
+
+    async def _run_domain(
+        self,
+        key: str,
+        jobs: list,
+        func: Callable[[Any], Awaitable[Any]],
+        is_success: Callable[[Any], bool | None],
+        skip_rate_limit: Callable[[Any], bool],
+        results: list,
+    ):
+        limit = self.get_limit(key)
+        bucket = TokenBucket(rate=limit.rate, capacity=limit.burst)
+        limiter = self.create_limiter(key)
+        self.limiters[key] = limiter
+        queue = deque(jobs)
+
+        async def worker():
+            while queue:
+                epoch = await limiter.acquire()
+                if not queue:
+                    await limiter.release(epoch=epoch, latency=0.0, ok=None)
+                    return
+                job = queue.popleft()
+                start = time.monotonic()
+                ok = False
+                try:
+                    if not skip_rate_limit(job):
+                        await bucket.acquire()
+                    start = time.monotonic()
+                    result = await func(job)
+                    ok = is_success(result)
+                    results.append(result)
+                finally:
+                    await limiter.release(
+                        epoch=epoch, latency=time.monotonic() - start, ok=ok
+                    )
+
+        await asyncio.gather(
+            *[worker() for _ in range(min(limiter.maximum, len(jobs)))]
+        )
+
+    async def run(
+        self,
+        jobs_by_key: dict[str, list],
+        func: Callable[[Any], Awaitable[Any]],
+        is_success: Callable[[Any], bool | None] = lambda result: True,
+        skip_rate_limit: Callable[[Any], bool] = lambda job: False,
+    ) -> list:
+        results = []
+        await asyncio.gather(
+            *[
+                self._run_domain(
+                    key=key,
+                    jobs=jobs,
+                    func=func,
+                    is_success=is_success,
+                    skip_rate_limit=skip_rate_limit,
+                    results=results,
+                )
+                for key, jobs in jobs_by_key.items()
+                if jobs
+            ]
+        )
+        return results
+
+    def stats(self) -> dict:
+        return {key: limiter.stats() for key, limiter in self.limiters.items()}
@@ -1,14 +1,11 @@
 import asyncio
+from typing import Awaitable, Callable
 from urllib.parse import urlparse
 import uuid
 
+from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from domain.models.notification import command as noti_cmd
-from domain.models.pricelog import command as p_cmd
-from databases.sql import util as db_util
-from databases.sql.pricelog import repository as p_repo
-from databases.sql.notification import repository as n_repo
 from app.sofmap import web_scraper as sofmap_scraper
 from app.geo import web_scraper as geo_scraper
 from app.iosys import web_scraper as iosys_scraper
@@ -16,157 +13,639 @@ from app.gemini import web_scraper as gemini_scraper
 from common import read_config
 from app.activitylog.update import UpdateActivityLog
 from app.activitylog.util import is_updating_urls_or_sending_to_api
-from . import constants as update_const
+from domain.models.activitylog import command as act_cmd, enums as act_enums
+from databases.sql import util as db_util
+from databases.sql.pricelog.id_cache import fill_id_caches
+from databases.sql.notification.repository import ScrapeTargetRepository
+from domain.models.notification.command import ScrapeTargetGetCommand
+from domain.models.notification.notification import ScrapeTarget
+from . import constants as update_const, change_estimator, checkpoint, gemini_lane
+from .pricelog_writer import PriceLogWriter
+from .scheduler import DomainScheduler, DEFAULT_DOMAIN_KEY
+from .circuit_breaker import CircuitBreakers, CircuitBreakerState, is_site_failure
 from app.getdata.models import search as search_models
+from app.getdata.models.error import APIError
+from app.getdata import get_search_stats
 from app.enums import SiteName, SupportDomain
 
 
-async def _scrape_one_url(url_id: int, urlopts: read_config.UpdateURLOptions, log=None):
-    async for ses in db_util.get_async_session():
-        urlrepo = p_repo.URLRepository(ses=ses)
-        urloptrepo = n_repo.URLUpdateParameterRepository(ses=ses)
-        target_url = await urlrepo.get(command=p_cmd.URLGetCommand(id=url_id))
-        if not target_url:
-            if log:
-                log.warning("URL not found", url_id=url_id)
-            return {"url_id": url_id, "ok": False, "msg": "URL not found"}
-        target_url_str = target_url.url
-        parsed_url = urlparse(target_url_str)
-        if not parsed_url.scheme or not parsed_url.netloc:
-            if log:
-                log.error("Invalid URL", url=target_url_str)
-            return {"url_id": url_id, "ok": False, "msg": "Invalid URL"}
-
-        ok = False
-        result = ""
-        try:
-            db_urlopt = await urloptrepo.get(
-                command=noti_cmd.URLUpdateParameterGetCommand(url_id=url_id)
+def _get_sitename(target: ScrapeTarget) -> str | None:
+    if target.sitename == SiteName.GEMINI.value:
+        return SiteName.GEMINI.value
+    match urlparse(target.url).netloc:
+        case SupportDomain.SOFMAP.value | SupportDomain.A_SOFMAP.value:
+            return SiteName.SOFMAP.value
+        case SupportDomain.GEO.value:
+            return SiteName.GEO.value
+        case SupportDomain.IOSYS.value:
+            return SiteName.IOSYS.value
+        case _:
+            return None
+
+
+def _create_searchreq(target: ScrapeTarget, urlopts: read_config.UpdateURLOptions):
+    sitename = _get_sitename(target)
+    match sitename:
+        case SiteName.GEMINI.value:
+            return gemini_scraper, search_models.SearchRequest(
+                url=target.url,
+                search_keyword="",
+                sitename=SiteName.GEMINI.value,
+                options=target.meta or {},
             )
-            if db_urlopt and db_urlopt[0].sitename == SiteName.GEMINI.value:
-                searchreq = search_models.SearchRequest(
-                    url=target_url_str,
-                    search_keyword="",
-                    sitename=SiteName.GEMINI.value,
-                    options=db_urlopt[0].meta,
-                )
-                ok, result = await gemini_scraper.download_with_api(
-                    ses=ses, searchreq=searchreq, save_to_db=True
-                )
-            else:
-                match parsed_url.netloc:
-                    case SupportDomain.SOFMAP.value | SupportDomain.A_SOFMAP.value:
-                        searchreq = search_models.SearchRequest(
-                            url=target_url_str,
-                            search_keyword=None,
-                            sitename=SiteName.SOFMAP.value,
-                            options=urlopts.request_options.model_dump(
-                                exclude_none=True
-                            ),
-                        )
-                        ok, result = await sofmap_scraper.download_with_api(
-                            ses=ses, searchreq=searchreq, save_to_db=True
-                        )
-                    case SupportDomain.GEO.value:
-                        searchreq = search_models.SearchRequest(
-                            url=target_url_str,
-                            search_keyword=None,
-                            sitename=SiteName.GEO.value,
-                            options=urlopts.request_options.model_dump(
-                                exclude_none=True
-                            ),
-                        )
-                        ok, result = await geo_scraper.download_with_api(
-                            ses=ses, searchreq=searchreq, save_to_db=True
-                        )
-                    case SupportDomain.IOSYS.value:
-                        searchreq = search_models.SearchRequest(
-                            url=target_url_str,
-                            search_keyword=None,
-                            sitename=SiteName.IOSYS.value,
-                            options=urlopts.request_options.model_dump(
-                                exclude_none=True
-                            ),
-                        )
-                        ok, result = await iosys_scraper.download_with_api(
-                            ses=ses, searchreq=searchreq, save_to_db=True
-                        )
-                    case _:
-                        msg = f"Unsupported netloc: {parsed_url.netloc}"
-                        if log:
-                            log.error(
-                                "Unsupported netloc",
-                                url=target_url.url,
-                                netloc=parsed_url.netloc,
-                            )
-                        return {"url_id": url_id, "ok": False, "msg": msg}
-        except Exception as e:
-            if log:
-                log.error(f"Scraping failed for {target_url_str} with error: {e}")
-            return {"url_id": url_id, "ok": False, "msg": str(e)}
-
-        if ok:
-            await ses.refresh(target_url)
-            target_id = target_url.id
-            if log:
-                log.info("update and save ... ok", url=target_url_str)
-            await asyncio.sleep(update_const.OK_WAIT_TIME)
-            return {"url_id": target_id, "ok": True, "msg": ""}
-
-        msg = result
+        case SiteName.SOFMAP.value:
+            scraper = sofmap_scraper
+        case SiteName.GEO.value:
+            scraper = geo_scraper
+        case SiteName.IOSYS.value:
+            scraper = iosys_scraper
+        case _:
+            return None, None
+    return scraper, search_models.SearchRequest(
+        url=target.url,
+        search_keyword=None,
+        sitename=sitename,
+        options=urlopts.request_options.model_dump(exclude_none=True),
+    )
+
+
+async def _scrape_one_url(
+    target: ScrapeTarget,
+    urlopts: read_config.UpdateURLOptions,
+    breakers: CircuitBreakers | None = None,
+    handle_rows: Callable[[list], Awaitable[None]] | None = None,
+    log=None,
+) -> tuple[dict, list]:
+    url_id = target.url_id
+    target_url_str = target.url
+    parsed_url = urlparse(target_url_str)
+    if not parsed_url.scheme or not parsed_url.netloc:
+        if log:
+            log.error("Invalid URL", url=target_url_str)
+        return {
+            "url_id": url_id,
+            "ok": False,
+            "msg": "Invalid URL",
+            "not_sent": True,
+        }, []
+
+    scraper, searchreq = _create_searchreq(target=target, urlopts=urlopts)
+    if not scraper:
+        msg = f"Unsupported netloc: {parsed_url.netloc}"
         if log:
-            log.error("update and save ... ng", url=target_url_str, error_msg=msg)
-        await ses.refresh(target_url)
-        target_id = target_url.id
-        await asyncio.sleep(update_const.NG_WAIT_TIME)
-        return {"url_id": target_id, "ok": False, "msg": msg}
+            log.error(
+                "Unsupported netloc", url=target_url_str, netloc=parsed_url.netloc
+            )
+        return {"url_id": url_id, "ok": False, "msg": msg, "not_sent": True}, []
 
+    breaker = breakers.get(searchreq.sitename) if breakers else None
+    if breaker and not breaker.allow():
+        msg = f"circuit open: {searchreq.sitename}"
+        if log:
+            log.warning("scraping ... skipped", url=target_url_str, error_msg=msg)
+        return {
+            "url_id": url_id,
+            "ok": False,
+            "msg": msg,
+            "circuit_open": True,
+            "not_sent": True,
+        }, []
 
-async def scraping_and_save_target_urls(
-    ses: AsyncSession, log=None, caller_type: str = None, url_id: int = None
+    try:
+        if urlopts.streaming.enable and handle_rows:
+            # 結果は届いた分から handle_rows に渡し、まとめて保持しない
+            ok, result = await scraper.download_with_api_stream(
+                searchreq=searchreq,
+                handle=handle_rows,
+                chunk_size=urlopts.streaming.chunk_size,
+            )
+            if ok:
+                result = []
+        else:
+            # 保存は PriceLogWriter でまとめて行う。定期更新は常に最新の結果を取得する
+            ok, result = await scraper.download_with_api(
+                ses=None, searchreq=searchreq, save_to_db=False, use_cache=False
+            )
+    except Exception as e:
+        res = _create_error_result(url_id=url_id, msg=APIError.from_exception(e))
+        if breaker:
+            breaker.record(ok=not is_site_failure(res))
+        if log:
+            log.error(f"Scraping failed for {target_url_str} with error: {e}")
+        return res, []
+
+    if ok:
+        if breaker:
+            breaker.record(ok=True)
+        if log:
+            log.info("scraping ... ok", url=target_url_str)
+        return {"url_id": url_id, "ok": True, "msg": ""}, result
+
+    res = _create_error_result(url_id=url_id, msg=result)
+    if breaker:
+        # URL 毎のエラー (商品が無い等) はサイトが応答しているため失敗に数えない
+        breaker.record(ok=not is_site_failure(res))
+    if log:
+        log.error("scraping ... ng", url=target_url_str, error_msg=res["msg"])
+    return res, []
+
+
+def _create_error_result(url_id: int, msg: str) -> dict:
+    # API の呼び出しで失敗した場合は、その種類と HTTP ステータスを結果に残す
+    return {
+        "url_id": url_id,
+        "ok": False,
+        "msg": str(msg),
+        "error_kind": getattr(msg, "kind", None),
+        "status_code": getattr(msg, "status_code", None),
+    }
+
+
+def _is_success_for_limiter(res: dict) -> bool | None:
+    # 送信前の失敗や URL 毎のエラー (商品が無い等) はサイトの負荷と関係ないため、
+    # 並列数の調整に使わない。サーキットブレーカーと同じ基準で失敗とする
+    if res.get("not_sent"):
+        return None
+    if res["ok"]:
+        return True
+    if is_site_failure(res):
+        return False
+    return None
+
+
+def get_domain_key(url: str, sitename: str | None = None) -> str:
+    if sitename == SiteName.GEMINI.value:
+        return SiteName.GEMINI.value
+    netloc = urlparse(url).netloc
+    for domain in SupportDomain:
+        if domain.value == netloc:
+            return domain.name.lower()
+    return DEFAULT_DOMAIN_KEY
+
+
+def _group_url_ids_by_domain(
+    url_ids: list[int], targets: dict[int, ScrapeTarget]
+) -> dict[str, list[int]]:
+    grouped: dict[str, list[int]] = {}
+    for url_id in url_ids:
+        target = targets[url_id]
+        key = get_domain_key(url=target.url, sitename=target.sitename)
+        grouped.setdefault(key, []).append(url_id)
+    return grouped
+
+
+def _split_gemini_lane(
+    url_ids_by_domain: dict[str, list[int]],
+) -> tuple[dict[str, list[int]], list[int]]:
+    urlopts = read_config.get_update_url_options()
+    if not urlopts.gemini_lane.enable:
+        return url_ids_by_domain, []
+    gemini_url_ids = url_ids_by_domain.pop(SiteName.GEMINI.value, [])
+    return url_ids_by_domain, gemini_url_ids
+
+
+async def _prioritize_url_ids(
+    ses: AsyncSession,
+    url_ids: list[int],
+    opts: read_config.PrioritizationOptions,
+    log=None,
+) -> tuple[list[int], list[int]]:
+    estimates = await change_estimator.get_change_estimates(
+        ses=ses, url_ids=url_ids, history_days=opts.history_days
+    )
+    selected, skipped = change_estimator.select_url_ids_to_scrape(
+        estimates=estimates, opts=opts
+    )
+    if log:
+        log.info(
+            "prioritize target urls",
+            total=len(url_ids),
+            selected=len(selected),
+            skipped=len(skipped),
+        )
+    return selected, skipped
+
+
+class ScrapingRun(BaseModel):
+    activitylog_id: int
+    caller_type: str | None = None
+    url_ids_by_domain: dict[str, list[int]] = Field(default_factory=dict)
+    skipped_url_ids: list[int] = Field(default_factory=list)
+    resumed_results: list[dict] = Field(default_factory=list)
+    gemini_url_ids: list[int] = Field(default_factory=list)
+
+
+class ScrapingBatchResult(BaseModel):
+    results: list[dict] = Field(default_factory=list)
+    domain_stats: dict[str, dict] = Field(default_factory=dict)
+    breaker_states: dict[str, CircuitBreakerState] = Field(default_factory=dict)
+    breaker_events: list[dict] = Field(default_factory=list)
+
+    def merge(self, other: "ScrapingBatchResult"):
+        self.results.extend(other.results)
+        self.breaker_states.update(other.breaker_states)
+        self.breaker_events.extend(other.breaker_events)
+        for key, stats in other.domain_stats.items():
+            if key not in self.domain_stats:
+                self.domain_stats[key] = dict(stats)
+                continue
+            merged = self.domain_stats[key]
+            merged["limit"] = max(merged["limit"], stats["limit"])
+            merged["increases"] += stats["increases"]
+            merged["decreases"] += stats["decreases"]
+
+
+async def _get_resumable_run(
+    up_activitylog: UpdateActivityLog, activitylog_id: int, log=None
 ):
+    db_activitylog = await up_activitylog.get(
+        command=act_cmd.ActivityLogGetCommand(id=activitylog_id)
+    )
+    msg = ""
+    if not db_activitylog:
+        msg = f"run is not found, id: {activitylog_id}"
+    elif db_activitylog.activity_type != update_const.SCRAPING_URL_ACTIVITY_TYPE:
+        msg = f"run is not {update_const.SCRAPING_URL_ACTIVITY_TYPE}, id: {activitylog_id}"
+    elif db_activitylog.current_state == act_enums.UpdateStatus.COMPLETED.name:
+        msg = f"run is already completed, id: {activitylog_id}"
+    if msg:
+        if log:
+            log.warning(msg)
+        return None
+    return db_activitylog
+
+
+async def start_scraping_run(
+    ses: AsyncSession,
+    log=None,
+    caller_type: str = None,
+    url_id: int = None,
+    force: bool = False,
+    resume_activitylog_id: int | None = None,
+) -> ScrapingRun | None:
     up_activitylog = UpdateActivityLog(ses=ses)
-    if await is_updating_urls_or_sending_to_api(updateactlog=up_activitylog):
+    if await is_updating_urls_or_sending_to_api(
+        updateactlog=up_activitylog,
+        exclude_ids=[resume_activitylog_id] if resume_activitylog_id else None,
+    ):
         msg = "cancelled due to updating urls or sending to api."
         if log:
             log.warning(msg)
-        return
+        return None
 
+    if resume_activitylog_id:
+        db_activitylog = await _get_resumable_run(
+            up_activitylog=up_activitylog,
+            activitylog_id=resume_activitylog_id,
+            log=log,
+        )
+        if not db_activitylog:
+            return None
+        resume_count = db_activitylog.meta.get("resume_count", 0) + 1
+        skipped_url_ids = db_activitylog.meta.get("skipped_url_ids", [])
+        run_url_id = db_activitylog.meta.get("url_id")
+        await up_activitylog.update(
+            id=resume_activitylog_id,
+            next_status=act_enums.UpdateStatus.IN_PROGRESS.name,
+            add_subinfo={"resume_count": resume_count},
+            error_msg="",
+        )
+        lane_activitylog_ids = await gemini_lane.cancel_gemini_lanes_in_progress(
+            ses=ses,
+            run_activitylog_id=resume_activitylog_id,
+            error_msg=f"interrupted, resumed by {resume_activitylog_id}",
+        )
+        return await _create_resumed_run(
+            ses=ses,
+            run_activitylog_id=resume_activitylog_id,
+            skipped_url_ids=skipped_url_ids,
+            url_id=run_url_id,
+            gemini_lane_activitylog_ids=lane_activitylog_ids,
+            caller_type=caller_type,
+            log=log,
+        )
+
+    # チェックポイントは URL 毎に増え続けるため、保持期間を過ぎたものを削除する
+    await checkpoint.prune_checkpoints(
+        ses=ses,
+        retention_days=read_config.get_update_url_options().checkpoint_retention_days,
+        log=log,
+    )
     db_activitylog = await up_activitylog.create(
         target_id=str(uuid.uuid4()),
         activity_type=update_const.SCRAPING_URL_ACTIVITY_TYPE,
         caller_type=caller_type,
+        # 再開時に同じ URL だけを対象にするため、対象の URL を記録する
+        subinfo={"url_id": url_id} if url_id else {},
     )
     activitylog_id = db_activitylog.id
     await up_activitylog.in_progress(id=activitylog_id)
+    if log:
+        log.info("start scraping run", activitylog_id=activitylog_id)
 
-    urlnotirepo = n_repo.URLNotificationRepository(ses=ses)
-
-    command = noti_cmd.URLNotificationGetCommand(is_active=True)
-    if url_id:
-        command.url_id = url_id
-
-    target_urlnotis = await urlnotirepo.get(command=command)
-    if not target_urlnotis:
+    targetrepo = ScrapeTargetRepository(ses=ses)
+    targets = await targetrepo.get(
+        command=ScrapeTargetGetCommand(url_id=url_id, is_active=True)
+    )
+    if not targets:
         msg = "No target urls"
         if url_id:
             msg = f"No active target url for url_id: {url_id}"
         await up_activitylog.canceled(id=activitylog_id, error_msg=msg)
         if log:
             log.warning(msg)
-        return
+        return None
 
-    target_url_ids = [urlnoti.url_id for urlnoti in target_urlnotis]
+    target_url_ids = [target.url_id for target in targets]
     urlopts = read_config.get_update_url_options()
-    tasks = [
-        _scrape_one_url(url_id, urlopts=urlopts, log=log) for url_id in target_url_ids
+    skipped_url_ids = []
+    if urlopts.prioritization.enable and not url_id and not force:
+        target_url_ids, skipped_url_ids = await _prioritize_url_ids(
+            ses=ses, url_ids=target_url_ids, opts=urlopts.prioritization, log=log
+        )
+        # 再開時に同じ対象となるよう、スキップしたURLを先に記録する
+        await up_activitylog.update(
+            id=activitylog_id, add_subinfo={"skipped_url_ids": skipped_url_ids}
+        )
+    url_ids_by_domain, gemini_url_ids = _split_gemini_lane(
+        _group_url_ids_by_domain(
+            url_ids=target_url_ids,
+            targets={target.url_id: target for target in targets},
+        )
+    )
+    return ScrapingRun(
+        activitylog_id=activitylog_id,
+        caller_type=caller_type,
+        url_ids_by_domain=url_ids_by_domain,
+        skipped_url_ids=skipped_url_ids,
+        gemini_url_ids=gemini_url_ids,
+    )
+
+
+async def _create_resumed_run(
+    ses: AsyncSession,
+    run_activitylog_id: int,
+    skipped_url_ids: list[int],
+    url_id: int | None = None,
+    gemini_lane_activitylog_ids: list[int] | None = None,
+    caller_type: str | None = None,
+    log=None,
+) -> ScrapingRun:
+    targetrepo = ScrapeTargetRepository(ses=ses)
+    targets = await targetrepo.get(
+        command=ScrapeTargetGetCommand(url_id=url_id, is_active=True)
+    )
+    checkpoints = await checkpoint.get_checkpoint_results(
+        ses=ses, run_activitylog_id=run_activitylog_id
+    )
+    resumed_results = [res for res in checkpoints.values() if res["ok"]]
+    done_url_ids = {res["url_id"] for res in resumed_results} | set(skipped_url_ids)
+    # 以前の Gemini レーンで取得済みの URL も除く
+    for lane_activitylog_id in gemini_lane_activitylog_ids or []:
+        lane_checkpoints = await checkpoint.get_checkpoint_results(
+            ses=ses, run_activitylog_id=lane_activitylog_id
+        )
+        done_url_ids |= {
+            res["url_id"] for res in lane_checkpoints.values() if res["ok"]
+        }
+    target_url_ids = [
+        target.url_id for target in targets if target.url_id not in done_url_ids
     ]
-    if urlopts.excution_strategy == "sequential":
-        results = []
-        for task in tasks:
-            results.append(await task)
-    else:  # parallel
-        results = await asyncio.gather(*tasks)
+    if log:
+        log.info(
+            "resume scraping run",
+            activitylog_id=run_activitylog_id,
+            completed=len(resumed_results),
+            remaining=len(target_url_ids),
+        )
+    url_ids_by_domain, gemini_url_ids = _split_gemini_lane(
+        _group_url_ids_by_domain(
+            url_ids=target_url_ids,
+            targets={target.url_id: target for target in targets},
+        )
+    )
+    return ScrapingRun(
+        activitylog_id=run_activitylog_id,
+        caller_type=caller_type,
+        url_ids_by_domain=url_ids_by_domain,
+        skipped_url_ids=skipped_url_ids,
+        resumed_results=resumed_results,
+        gemini_url_ids=gemini_url_ids,
+    )
+
+
+async def start_gemini_lane(
+    ses: AsyncSession, run: ScrapingRun, log=None
+) -> ScrapingRun | None:
+    """
+    Create the Gemini lane of a run as a separate ScrapingRun.
+
+    The lane has its own ActivityLog, linked to the run by target_id, and takes
+    at most the remaining daily quota of Gemini URLs.
+    """
+    if not run.gemini_url_ids:
+        return None
+    if await gemini_lane.is_gemini_lane_in_progress(ses=ses):
+        if log:
+            log.warning(
+                "gemini lane is in progress, skip gemini urls",
+                count=len(run.gemini_url_ids),
+            )
+        return None
+
+    urlopts = read_config.get_update_url_options()
+    remaining = await gemini_lane.get_remaining_quota(
+        ses=ses, daily_quota=urlopts.gemini_lane.daily_quota
+    )
+    target_url_ids = run.gemini_url_ids
+    deferred_url_ids = []
+    if remaining is not None:
+        target_url_ids = run.gemini_url_ids[:remaining]
+        deferred_url_ids = run.gemini_url_ids[remaining:]
+
+    up_activitylog = UpdateActivityLog(ses=ses)
+    db_activitylog = await up_activitylog.create(
+        target_id=str(run.activitylog_id),
+        target_table=checkpoint.CHECKPOINT_TARGET_TABLE,
+        activity_type=update_const.GEMINI_LANE_ACTIVITY_TYPE,
+        status=act_enums.UpdateStatus.IN_PROGRESS.name,
+        caller_type=run.caller_type or "",
+        subinfo={"skipped_url_ids": deferred_url_ids},
+    )
+    lane_activitylog_id = db_activitylog.id
+    await up_activitylog.update(
+        id=run.activitylog_id,
+        add_subinfo={"gemini_lane_activitylog_id": lane_activitylog_id},
+    )
+    if log:
+        log.info(
+            "start gemini lane",
+            activitylog_id=lane_activitylog_id,
+            targets=len(target_url_ids),
+            deferred=len(deferred_url_ids),
+        )
+    if not target_url_ids:
+        await up_activitylog.canceled(
+            id=lane_activitylog_id, error_msg="daily quota exceeded"
+        )
+        return None
+    return ScrapingRun(
+        activitylog_id=lane_activitylog_id,
+        caller_type=run.caller_type,
+        url_ids_by_domain={SiteName.GEMINI.value: target_url_ids},
+        skipped_url_ids=deferred_url_ids,
+    )
+
+
+async def _scrape_and_enqueue(
+    target: ScrapeTarget,
+    urlopts: read_config.UpdateURLOptions,
+    writer: PriceLogWriter,
+    breakers: CircuitBreakers | None = None,
+    log=None,
+):
+    res, pricelogs = await _scrape_one_url(
+        target,
+        urlopts=urlopts,
+        breakers=breakers,
+        handle_rows=lambda rows: writer.put_rows(url_id=target.url_id, pricelogs=rows),
+        log=log,
+    )
+    await writer.put(result=res, pricelogs=pricelogs)
+    return res
+
+
+async def _get_targets_by_domain(
+    ses: AsyncSession, url_ids_by_domain: dict[str, list[int]], log=None
+) -> tuple[dict[str, list[ScrapeTarget]], list[dict]]:
+    url_ids = [url_id for url_ids in url_ids_by_domain.values() for url_id in url_ids]
+    targetrepo = ScrapeTargetRepository(ses=ses)
+    targets = {
+        target.url_id: target
+        for target in await targetrepo.get(
+            command=ScrapeTargetGetCommand(url_ids=url_ids, is_active=None)
+        )
+    }
+    targets_by_domain: dict[str, list[ScrapeTarget]] = {}
+    not_found_results = []
+    for key, ids in url_ids_by_domain.items():
+        for url_id in ids:
+            if url_id not in targets:
+                if log:
+                    log.warning("URL not found", url_id=url_id)
+                not_found_results.append(
+                    {"url_id": url_id, "ok": False, "msg": "URL not found"}
+                )
+                continue
+            targets_by_domain.setdefault(key, []).append(targets[url_id])
+    return targets_by_domain, not_found_results
+
+
+async def scrape_url_ids_by_domain(
+    ses: AsyncSession,
+    url_ids_by_domain: dict[str, list[int]],
+    run: ScrapingRun | None = None,
+    breaker_states: dict[str, CircuitBreakerState] | None = None,
+    limit_parts: int = 1,
+    log=None,
+) -> ScrapingBatchResult:
+    urlopts = read_config.get_update_url_options()
+    # 対象の URL 情報はまとめて取得し、URL 毎の問い合わせをなくす
+    targets_by_domain, not_found_results = await _get_targets_by_domain(
+        ses=ses, url_ids_by_domain=url_ids_by_domain, log=log
+    )
+    targets = [target for ts in targets_by_domain.values() for target in ts]
+    await fill_id_caches(
+        ses=ses, url_ids={target.url: target.url_id for target in targets}
+    )
+    writer = PriceLogWriter(
+        opts=urlopts.writer,
+        run_activitylog_id=run.activitylog_id if run else None,
+        caller_type=run.caller_type if run else None,
+        log=log,
+    )
+    writer_task = asyncio.create_task(writer.run())
+    breakers = None
+    if urlopts.circuit_breaker.enable:
+        breakers = CircuitBreakers(opts=urlopts.circuit_breaker, states=breaker_states)
+    domain_stats = {}
+    try:
+        for res in not_found_results:
+            await writer.put(result=res, pricelogs=[])
+        match urlopts.excution_strategy:
+            case "sequential":
+                for target in targets:
+                    res = await _scrape_and_enqueue(
+                        target,
+                        urlopts=urlopts,
+                        writer=writer,
+                        breakers=breakers,
+                        log=log,
+                    )
+                    if res.get("circuit_open"):
+                        continue
+                    if res["ok"]:
+                        await asyncio.sleep(update_const.OK_WAIT_TIME)
+                    else:
+                        await asyncio.sleep(update_const.NG_WAIT_TIME)
+            case "parallel":
+                await asyncio.gather(
+                    *[
+                        _scrape_and_enqueue(
+                            target,
+                            urlopts=urlopts,
+                            writer=writer,
+                            breakers=breakers,
+                            log=log,
+                        )
+                        for target in targets
+                    ]
+                )
+            case _:  # domain
+                scheduler = DomainScheduler(
+                    limits=urlopts.domain_limits, parts=limit_parts
+                )
+                await scheduler.run(
+                    jobs_by_key=targets_by_domain,
+                    func=lambda target: _scrape_and_enqueue(
+                        target,
+                        urlopts=urlopts,
+                        writer=writer,
+                        breakers=breakers,
+                        log=log,
+                    ),
+                    is_success=_is_success_for_limiter,
+                    # 遮断中のサイトはすぐに失敗させるため、レート制限を待たない
+                    skip_rate_limit=lambda target: bool(breakers)
+                    and breakers.is_open(_get_sitename(target)),
+                )
+                domain_stats = scheduler.stats()
+                if log:
+                    log.info("domain concurrency", stats=domain_stats)
+    finally:
+        await writer.close()
+        results = await writer_task
+    if log:
+        log.info("search api stats", **get_search_stats())
+    if not breakers:
+        return ScrapingBatchResult(results=results, domain_stats=domain_stats)
+    if log:
+        for event in breakers.events():
+            log.warning("circuit breaker", **event)
+    return ScrapingBatchResult(
+        results=results,
+        domain_stats=domain_stats,
+        breaker_states=breakers.states(),
+        breaker_events=breakers.events(),
+    )
+
+
+async def finish_scraping_run(
+    ses: AsyncSession, run: ScrapingRun, batch_result: ScrapingBatchResult
+):
+    up_activitylog = UpdateActivityLog(ses=ses)
+    activitylog_id = run.activitylog_id
+    results = run.resumed_results + batch_result.results
 
     target_results = {}
     err_msgs = []
@@ -181,10 +660,19 @@ async def scraping_and_save_target_urls(
             err_ids.append(url_id)
 
     add_subinfo = {"target_results": target_results}
+    if batch_result.domain_stats:
+        add_subinfo["domain_stats"] = batch_result.domain_stats
+    if batch_result.breaker_events:
+        add_subinfo["circuit_breaker_events"] = batch_result.breaker_events
+    if run.skipped_url_ids:
+        add_subinfo["skipped_url_ids"] = run.skipped_url_ids
+    unchanged_url_ids = [res["url_id"] for res in results if res.get("unchanged")]
+    if unchanged_url_ids:
+        add_subinfo["unchanged_url_ids"] = unchanged_url_ids
     if not err_msgs:
         await up_activitylog.completed(id=activitylog_id, add_subinfo=add_subinfo)
         return
-    elif len(err_ids) == len(target_url_ids):
+    elif len(err_ids) == len(results):
         await up_activitylog.failed(
             id=activitylog_id, error_msg=",".join(err_msgs), add_subinfo=add_subinfo
         )
@@ -194,3 +682,41 @@ async def scraping_and_save_target_urls(
             id=activitylog_id, error_msg=",".join(err_msgs), add_subinfo=add_subinfo
         )
         return
+
+
+async def _scrape_and_finish(ses: AsyncSession, run: ScrapingRun, log=None):
+    batch_result = await scrape_url_ids_by_domain(
+        ses=ses, url_ids_by_domain=run.url_ids_by_domain, run=run, log=log
+    )
+    await finish_scraping_run(ses=ses, run=run, batch_result=batch_result)
+
+
+async def scrape_gemini_lane(lane: ScrapingRun, log=None):
+    async for ses in db_util.get_async_session():
+        await _scrape_and_finish(ses=ses, run=lane, log=log)
+
+
+async def scraping_and_save_target_urls(
+    ses: AsyncSession,
+    log=None,
+    caller_type: str = None,
+    url_id: int = None,
+    force: bool = False,
+    resume_activitylog_id: int | None = None,
+):
+    run = await start_scraping_run(
+        ses=ses,
+        log=log,
+        caller_type=caller_type,
+        url_id=url_id,
+        force=force,
+        resume_activitylog_id=resume_activitylog_id,
+    )
+    if not run:
+        return
+    lane = await start_gemini_lane(ses=ses, run=run, log=log)
+    # Gemini レーンは別セッションで並行して実行し、他のサイトの完了を待たせない
+    await asyncio.gather(
+        _scrape_and_finish(ses=ses, run=run, log=log),
+        *([scrape_gemini_lane(lane=lane, log=log)] if lane else []),
+    )
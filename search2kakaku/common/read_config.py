@@ -1,28 +1,78 @@
+import importlib
+import signal
+import threading
 from typing import Literal
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 import settings
 
 
-class APISiteOption(BaseModel):
+class ConfigModel(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+
+class APISiteOption(ConfigModel):
     timeout: float = Field(default=10.0)
 
 
-class APIOtpion(BaseModel):
+class HedgingOptions(ConfigModel):
+    enable: bool = Field(default=False)
+    percentile: float = Field(default=0.9, gt=0, le=1)
+    min_samples: int = Field(default=20, ge=1)
+    min_delay: float = Field(default=1.0, ge=0)
+    max_extra_ratio: float = Field(default=0.1, ge=0)
+    exclude_sites: list[str] = Field(default_factory=lambda: ["gemini"])
+
+
+class HTTPClientOptions(ConfigModel):
+    max_connections: int = Field(default=20, ge=1)
+    max_keepalive_connections: int = Field(default=10, ge=0)
+    keepalive_expiry: float = Field(default=30.0, ge=0)
+    http2: bool = Field(default=False)
+
+
+class CategoryCacheOptions(ConfigModel):
+    ttl: float = Field(default=86400.0, ge=0)
+
+
+class SearchCacheOptions(ConfigModel):
+    enable: bool = Field(default=True)
+    backend: str = Field(default="memory")
+    max_entries: int = Field(default=1000, ge=1)
+    ttl: float = Field(default=300.0, ge=0)
+    site_ttl: dict[str, float] = Field(default_factory=dict)
+
+
+class SearchBatchOptions(ConfigModel):
+    enable: bool = Field(default=False)
+    max_batch_size: int = Field(default=20, ge=1)
+    concurrency: int = Field(default=4, ge=1)
+    window: float = Field(default=0.05, ge=0)
+    probe_interval: float = Field(default=3600.0, ge=0)
+    probe_timeout: float = Field(default=5.0, gt=0)
+    exclude_sites: list[str] = Field(default_factory=lambda: ["gemini"])
+
+
+class APIOtpion(ConfigModel):
     url: str
     timeout: float = Field(default=5.0)
     sofmap: APISiteOption | None = Field(default=None)
     geo: APISiteOption | None = Field(default=None)
     iosys: APISiteOption | None = Field(default=None)
     gemini: APISiteOption | None = Field(default=None)
+    hedging: HedgingOptions = Field(default_factory=HedgingOptions)
+    client: HTTPClientOptions = Field(default_factory=HTTPClientOptions)
+    category_cache: CategoryCacheOptions = Field(default_factory=CategoryCacheOptions)
+    cache: SearchCacheOptions = Field(default_factory=SearchCacheOptions)
+    batch: SearchBatchOptions = Field(default_factory=SearchBatchOptions)
 
 
-class APIOptions(BaseModel):
+class APIOptions(ConfigModel):
     get_data: APIOtpion
     post_data: APIOtpion
 
 
-class SQLParams(BaseModel):
+class SQLParams(ConfigModel):
     drivername: str
     database: str
     username: str | None = None
@@ -31,43 +81,133 @@ class SQLParams(BaseModel):
     port: str | None = None
 
 
-class DataBaseOptions(BaseModel):
+class IdCacheOptions(ConfigModel):
+    url_max_entries: int = Field(default=10000, ge=0)
+    shop_max_entries: int = Field(default=1000, ge=0)
+
+
+class SQLitePragmaOptions(ConfigModel):
+    # None の項目は PRAGMA を実行せず、SQLite の既定値のままにする
+    journal_mode: (
+        Literal["delete", "truncate", "persist", "memory", "wal", "off"] | None
+    ) = Field(default=None)
+    synchronous: Literal["off", "normal", "full", "extra"] | None = Field(default=None)
+    mmap_size: int | None = Field(default=None, ge=0)
+    cache_size: int | None = Field(default=None)
+    busy_timeout: int | None = Field(default=None, ge=0)
+
+
+class EnginePoolOptions(ConfigModel):
+    pool_size: int | None = Field(default=None, ge=1)
+    max_overflow: int | None = Field(default=None, ge=0)
+    pool_timeout: float | None = Field(default=None, ge=0)
+    pool_recycle: int | None = Field(default=None)
+    pool_pre_ping: bool | None = Field(default=None)
+
+
+class PostgreSQLOptions(ConfigModel):
+    copy_ingest: bool = Field(default=True)
+
+
+class StorageOptions(ConfigModel):
+    sqlite: SQLitePragmaOptions = Field(default_factory=SQLitePragmaOptions)
+    postgresql: PostgreSQLOptions = Field(default_factory=PostgreSQLOptions)
+    pool: EnginePoolOptions = Field(default_factory=EnginePoolOptions)
+
+
+class DataBaseOptions(ConfigModel):
     sync: SQLParams
     a_sync: SQLParams
+    id_cache: IdCacheOptions = Field(default_factory=IdCacheOptions)
+    storage: StorageOptions = Field(default_factory=StorageOptions)
 
 
-class LogOptions(BaseModel):
+class LogOptions(ConfigModel):
     directory_path: str
 
 
-class UpdateRequestOptions(BaseModel):
+class UpdateRequestOptions(ConfigModel):
     convert_to_direct_search: bool | None = Field(default=None)
     remove_duplicates: bool | None = Field(default=None)
 
 
-class UpdateURLOptions(BaseModel):
-    request_options: UpdateRequestOptions
-    excution_strategy: Literal["parallel", "sequential"] = Field(default="sequential")
+class DomainLimitOption(ConfigModel):
+    concurrency: int = Field(default=1, ge=1)
+    rate: float = Field(default=0.5, ge=0)
+    burst: int = Field(default=1, ge=1)
+    adaptive: bool = Field(default=False)
+    min_concurrency: int = Field(default=1, ge=1)
+    max_concurrency: int | None = Field(default=None, ge=1)
+    max_p95_latency: float = Field(default=10.0, ge=0)
+
 
+class PrioritizationOptions(ConfigModel):
+    enable: bool = Field(default=False)
+    history_days: int = Field(default=30, ge=1)
+    min_observations: int = Field(default=3, ge=1)
+    min_change_probability: float = Field(default=0.2, ge=0, le=1)
+    max_age_hours: float = Field(default=72.0, gt=0)
 
-class RedisOptions(BaseModel):
+
+class CircuitBreakerOptions(ConfigModel):
+    enable: bool = Field(default=True)
+    failure_threshold: int = Field(default=5, ge=1)
+    cooldown: float = Field(default=60.0, ge=0)
+
+
+class GeminiLaneOptions(ConfigModel):
+    enable: bool = Field(default=True)
+    daily_quota: int = Field(default=100, ge=0)
+
+
+class PriceLogWriterOptions(ConfigModel):
+    batch_rows: int = Field(default=500, ge=1)
+    flush_interval: float = Field(default=2.0, gt=0)
+    queue_size: int = Field(default=100, ge=1)
+    skip_unchanged: bool = Field(default=False)
+
+
+class StreamingOptions(ConfigModel):
+    enable: bool = Field(default=False)
+    chunk_size: int = Field(default=50, ge=1)
+
+
+class UpdateURLOptions(ConfigModel):
+    request_options: UpdateRequestOptions
+    excution_strategy: Literal["domain", "parallel", "sequential"] = Field(
+        default="domain"
+    )
+    domain_limits: dict[str, DomainLimitOption] = Field(default_factory=dict)
+    prioritization: PrioritizationOptions = Field(default_factory=PrioritizationOptions)
+    circuit_breaker: CircuitBreakerOptions = Field(
+        default_factory=CircuitBreakerOptions
+    )
+    gemini_lane: GeminiLaneOptions = Field(default_factory=GeminiLaneOptions)
+    checkpoint_retention_days: int = Field(default=7, ge=1)
+    writer: PriceLogWriterOptions = Field(default_factory=PriceLogWriterOptions)
+    streaming: StreamingOptions = Field(default_factory=StreamingOptions)
+
+
+class RedisOptions(ConfigModel):
     host: str
     port: int
     db: int
 
 
-class AutoUpdateOptions(BaseModel):
+class AutoUpdateOptions(ConfigModel):
     enable: bool = Field(default=True)
     schedule: dict = Field(default_factory=dict)
     notify_to_api: bool = Field(default=False)
+    batch_size: int = Field(default=50, ge=1)
+    domain_parallelism: int = Field(default=1, ge=1)
 
 
-class KakakuOptions(BaseModel):
+class KakakuOptions(ConfigModel):
     to_link: bool = Field(default=True)
     base_url: str = Field(default="")
 
 
-class HTMLOptions(BaseModel):
+class HTMLOptions(ConfigModel):
     kakaku: KakakuOptions
 
 
@@ -87,36 +227,105 @@ def to_lower_keys(obj):
         return obj
 
 
+class ConfigSnapshot(ConfigModel):
+    api_options: APIOptions
+    databases: DataBaseOptions
+    log_options: LogOptions
+    update_url_options: UpdateURLOptions
+    redis_options: RedisOptions
+    auto_update_options: AutoUpdateOptions
+    html_options: HTMLOptions
+
+
+def _create_snapshot() -> ConfigSnapshot:
+    return ConfigSnapshot(
+        api_options=to_lower_keys(settings.API_OPTIONS),
+        databases=to_lower_keys(settings.DATABASES),
+        log_options=to_lower_keys(settings.LOG_OPTIONS),
+        update_url_options=to_lower_keys(settings.UPDATE_URL_OPTIONS),
+        redis_options=to_lower_keys(settings.REDIS_OPTIONS),
+        auto_update_options=to_lower_keys(settings.AUTO_UPDATE_OPTIONS),
+        html_options=to_lower_keys(settings.HTML_OPTIONS),
+    )
+
+
+_snapshot: ConfigSnapshot | None = None
+_reload_lock = threading.RLock()
+
+
+def get_config() -> ConfigSnapshot:
+    """
+    Return the validated settings.
+
+    settings.py is read once and the same snapshot is returned until
+    reload_config(). The snapshot cannot be changed.
+    """
+    global _snapshot
+    if _snapshot is None:
+        with _reload_lock:
+            if _snapshot is None:
+                _snapshot = _create_snapshot()
+    return _snapshot
+
+
+def reload_config() -> ConfigSnapshot:
+    """
+    Read settings.py again and replace the snapshot.
+
+    When the new settings are invalid, the error is raised and the current
+    snapshot is kept. Settings used when starting (databases, redis, log) need
+    a restart to take effect.
+    """
+    global _snapshot
+    with _reload_lock:
+        importlib.reload(settings)
+        _snapshot = _create_snapshot()
+    return _snapshot
+
+
+def install_reload_signal_handler(log=None):
+    # SIGHUP で設定を読み直す。SIGHUP が無い環境やメインスレッド以外では何もしない
+    if not hasattr(signal, "SIGHUP"):
+        return
+    if threading.current_thread() is not threading.main_thread():
+        return
+
+    def _handler(signum, frame):
+        try:
+            reload_config()
+        except Exception as e:
+            if log:
+                log.error("reload config failed", error=e)
+            return
+        if log:
+            log.info("reload config")
+
+    signal.signal(signal.SIGHUP, _handler)
+
+
 def get_api_options():
-    lower_key_dict = to_lower_keys(settings.API_OPTIONS)
-    return APIOptions(**lower_key_dict)
+    return get_config().api_options
 
 
 def get_databases():
-    lower_key_dict = to_lower_keys(settings.DATABASES)
-    return DataBaseOptions(**lower_key_dict)
+    return get_config().databases
 
 
 def get_log_options():
-    lower_key_dict = to_lower_keys(settings.LOG_OPTIONS)
-    return LogOptions(**lower_key_dict)
+    return get_config().log_options
 
 
 def get_update_url_options():
-    lower_key_dict = to_lower_keys(settings.UPDATE_URL_OPTIONS)
-    return UpdateURLOptions(**lower_key_dict)
+    return get_config().update_url_options
 
 
 def get_redis_options():
-    lower_key_dict = to_lower_keys(settings.REDIS_OPTIONS)
-    return RedisOptions(**lower_key_dict)
+    return get_config().redis_options
 
 
 def get_auto_update_options():
-    lower_key_dict = to_lower_keys(settings.AUTO_UPDATE_OPTIONS)
-    return AutoUpdateOptions(**lower_key_dict)
+    return get_config().auto_update_options
 
 
 def get_html_options():
-    lower_key_dict = to_lower_keys(settings.HTML_OPTIONS)
-    return HTMLOptions(**lower_key_dict)
+    return get_config().html_options
@@ -18,11 +18,9 @@ def custom_tojson_japanese(value, indent=None):
     return json.dumps(value, ensure_ascii=False, indent=indent)
 
 
-htmlopts = get_html_options()
-apiopts = get_api_options()
-
-
 def create_tokakaku_link(id):
+    htmlopts = get_html_options()
+    apiopts = get_api_options()
     if not htmlopts.kakaku.to_link:
         return ""
     if not htmlopts.kakaku.base_url:
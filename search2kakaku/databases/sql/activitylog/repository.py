@@ -1,5 +1,5 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from sqlalchemy.sql import func
 
 from domain.models.activitylog import (
@@ -42,14 +42,13 @@ class ActivityLogRepository(a_repo.IActivityLogRepository):
             await ses.refresh(log_entry)
         return
 
-    async def get(
-        self, command: a_cmd.ActivityLogGetCommand
-    ) -> list[m_actlog.ActivityLog]:
+    def _create_stmt(self, command: a_cmd.ActivityLogGetCommand):
         stmt = select(m_actlog.ActivityLog)
         if command.id:
             stmt = stmt.where(m_actlog.ActivityLog.id == command.id)
         if command.target_id:
-            stmt = stmt.where(m_actlog.ActivityLog.target_id == command.target_id)
+            # target_id は文字列の列のため、int で比較しない (PostgreSQL では型エラーになる)
+            stmt = stmt.where(m_actlog.ActivityLog.target_id == str(command.target_id))
         if command.target_table:
             stmt = stmt.where(m_actlog.ActivityLog.target_table == command.target_table)
         if command.activity_types:
@@ -69,10 +68,25 @@ class ActivityLogRepository(a_repo.IActivityLogRepository):
                 m_actlog.ActivityLog.updated_at >= command.updated_at_start
             )
         if command.updated_at_end:
-            stmt = stmt.where(m_actlog.ActivityLog.updated_at >= command.updated_at_end)
+            stmt = stmt.where(m_actlog.ActivityLog.updated_at <= command.updated_at_end)
+        return stmt
 
-        res = await self.session.execute(stmt)
+    async def get(
+        self, command: a_cmd.ActivityLogGetCommand
+    ) -> list[m_actlog.ActivityLog]:
+        res = await self.session.execute(self._create_stmt(command))
         results = res.scalars()
         if not results:
             return []
         return results.all()
+
+    async def delete(self, command: a_cmd.ActivityLogDeleteCommand) -> int:
+        # 種類と更新日時の両方を必須にして、関係の無いログを消さないようにする
+        stmt = (
+            delete(m_actlog.ActivityLog)
+            .where(m_actlog.ActivityLog.activity_type.in_(command.activity_types))
+            .where(m_actlog.ActivityLog.updated_at <= command.updated_at_end)
+        )
+        res = await self.session.execute(stmt)
+        await self.session.commit()
+        return res.rowcount
@@ -0,0 +1,67 @@
+import json
+from typing import Callable
+
+from sqlalchemy import JSON, Table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+POSTGRESQL = "postgresql"
+SQLITE = "sqlite"
+
+# INSERT ... ON CONFLICT を使えるデータベース
+_UPSERT_INSERTS: dict[str, Callable] = {
+    POSTGRESQL: postgresql.insert,
+    SQLITE: sqlite.insert,
+}
+
+
+def get_dialect_name(ses: AsyncSession) -> str:
+    return ses.bind.dialect.name
+
+
+def get_upsert_insert(ses: AsyncSession) -> Callable | None:
+    """Return the insert() of the dialect that supports on_conflict_do_update."""
+    return _UPSERT_INSERTS.get(get_dialect_name(ses))
+
+
+def can_copy(ses: AsyncSession) -> bool:
+    return get_dialect_name(ses) == POSTGRESQL and ses.bind.dialect.driver == "asyncpg"
+
+
+async def copy_rows(ses: AsyncSession, table: Table, rows: list[dict]):
+    """
+    Add rows with PostgreSQL COPY on the connection of the session.
+
+    Runs in the transaction of the session when one has been started.
+    All rows must have the same keys. As with the ORM insert, None is replaced
+    by the scalar default of the column. JSON columns are sent as text.
+    """
+    if not rows:
+        return
+    columns = list(rows[0])
+    defaults = {
+        column.name: column.default.arg
+        for column in table.columns
+        if column.default is not None and column.default.is_scalar
+    }
+    json_columns = {
+        column.name for column in table.columns if isinstance(column.type, JSON)
+    }
+
+    def _to_record(row: dict) -> tuple:
+        record = []
+        for column in columns:
+            value = row[column]
+            if value is None:
+                value = defaults.get(column)
+            elif column in json_columns:
+                value = json.dumps(value, ensure_ascii=False)
+            record.append(value)
+        return tuple(record)
+
+    records = [_to_record(row) for row in rows]
+    conn = await ses.connection()
+    raw_conn = await conn.get_raw_connection()
+    await raw_conn.driver_connection.copy_records_to_table(
+        table.name, records=records, columns=columns, schema_name=table.schema
+    )
@@ -0,0 +1,174 @@
+"""
+Versioned schema migrations.
+
+create_all() only creates missing tables, so changes to existing tables such as
+new indexes are added here as a new Migration with the next version. Applied
+versions are recorded in the schema_version table. The statements must run on
+both SQLite and PostgreSQL and must be safe on a database that create_all() has
+just created with the current models, e.g. CREATE INDEX IF NOT EXISTS.
+"""
+
+from datetime import datetime, timezone
+
+from pydantic import BaseModel
+from sqlalchemy import Connection, insert, inspect, select, text
+from sqlmodel import Field, SQLModel
+
+from databases.sql import dialect
+
+# pg_advisory_xact_lock のキー。複数のプロセスが同時にマイグレーションしないようにする
+_PG_LOCK_KEY = 2_024_082_501
+
+
+class SchemaVersion(SQLModel, table=True):
+    __tablename__ = "schema_version"
+
+    version: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    name: str
+    applied_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class Migration(BaseModel):
+    version: int
+    name: str
+    statements: list[str]
+
+
+# 同じ値の行が他にあり、id が最小ではない行
+_DUPLICATE_URL_IDS = (
+    "SELECT id FROM url WHERE EXISTS"
+    " (SELECT 1 FROM url k WHERE k.url = url.url AND k.id < url.id)"
+)
+_DUPLICATE_SHOP_IDS = (
+    "SELECT id FROM shop WHERE EXISTS"
+    " (SELECT 1 FROM shop k WHERE k.name = shop.name AND k.id < shop.id)"
+)
+
+
+def _repoint_to_first(table: str, column: str, target: str, key: str) -> str:
+    # 重複した行への参照を、同じ値で id が最小の行に付け替える
+    duplicates = _DUPLICATE_URL_IDS if target == "url" else _DUPLICATE_SHOP_IDS
+    return (
+        f"UPDATE {table} SET {column} ="
+        f" (SELECT MIN(k.id) FROM {target} k JOIN {target} d ON k.{key} = d.{key}"
+        f" WHERE d.id = {table}.{column})"
+        f" WHERE {column} IN ({duplicates})"
+    )
+
+
+def _delete_duplicate_url_refs(table: str) -> str:
+    # URL 毎に1行のみ使うため、付け替えで重複した行は id が最小の行を残す
+    return (
+        f"DELETE FROM {table} WHERE EXISTS (SELECT 1 FROM {table} k"
+        f" WHERE k.url_id = {table}.url_id AND k.id < {table}.id)"
+    )
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        version=1,
+        name="add_hot_query_indexes",
+        statements=[
+            # PriceLogRepository.get と変化率の推定は URL 毎に created_at の範囲で読む
+            "CREATE INDEX IF NOT EXISTS ix_pricelog_url_id_created_at"
+            " ON pricelog (url_id, created_at)",
+            # 実行中のログや最新の完了ログは種類と状態、更新日時で検索する
+            "CREATE INDEX IF NOT EXISTS"
+            " ix_activitylog_activity_type_current_state_updated_at"
+            " ON activitylog (activity_type, current_state, updated_at)",
+            # チェックポイントと Gemini レーンは実行ログの id で検索する
+            "CREATE INDEX IF NOT EXISTS ix_activitylog_target_table_target_id"
+            " ON activitylog (target_table, target_id)",
+            # activity_type は上の複合インデックスの先頭列で引ける
+            "DROP INDEX IF EXISTS ix_activitylog_activity_type",
+        ],
+    ),
+    Migration(
+        version=2,
+        name="unique_url_and_shop",
+        statements=[
+            # 同時に保存した URL と Shop が重複していれば、id が最小の行にまとめる。
+            # 重複した URL の取得結果のダイジェストは消え、次の取得は変化ありとして保存される
+            f"DELETE FROM scrapedigest WHERE url_id IN ({_DUPLICATE_URL_IDS})",
+            _repoint_to_first(
+                table="pricelog", column="url_id", target="url", key="url"
+            ),
+            _repoint_to_first(
+                table="urlnotification", column="url_id", target="url", key="url"
+            ),
+            _repoint_to_first(
+                table="urlupdateparameter", column="url_id", target="url", key="url"
+            ),
+            _delete_duplicate_url_refs("urlnotification"),
+            _delete_duplicate_url_refs("urlupdateparameter"),
+            f"DELETE FROM url WHERE id IN ({_DUPLICATE_URL_IDS})",
+            _repoint_to_first(
+                table="pricelog", column="shop_id", target="shop", key="name"
+            ),
+            f"DELETE FROM shop WHERE id IN ({_DUPLICATE_SHOP_IDS})",
+            # PriceLogRepository は一意制約で同時に追加された行を検出する
+            "DROP INDEX IF EXISTS ix_url_url",
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_url_url ON url (url)",
+            "DROP INDEX IF EXISTS ix_shop_name",
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_shop_name ON shop (name)",
+        ],
+    ),
+]
+
+
+def get_current_version(conn: Connection) -> int:
+    version = conn.execute(
+        select(SchemaVersion.version).order_by(SchemaVersion.version.desc()).limit(1)
+    ).scalar()
+    return version or 0
+
+
+def _begin_locked(conn: Connection):
+    name = conn.dialect.name
+    if name == dialect.SQLITE:
+        # 読み取りから始めると他のプロセスと書き込みが競合するため、先に書き込みロックを取る
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        return
+    conn.begin()
+    if name == dialect.POSTGRESQL:
+        conn.execute(text(f"SELECT pg_advisory_xact_lock({_PG_LOCK_KEY})"))
+
+
+def upgrade(conn: Connection, log=None) -> list[int]:
+    """
+    Apply the migrations newer than the version of the database and return the
+    applied versions. The connection must not be in a transaction.
+    """
+    # 起動の度に呼ばれるため、最新であればロックを取らずに終わる
+    is_latest = (
+        inspect(conn).has_table(SchemaVersion.__tablename__)
+        and get_current_version(conn) >= MIGRATIONS[-1].version
+    )
+    conn.rollback()
+    if is_latest:
+        return []
+
+    applied = []
+    _begin_locked(conn)
+    SchemaVersion.__table__.create(conn, checkfirst=True)
+    # ロックを待つ間に他のプロセスが適用している場合がある
+    current = get_current_version(conn)
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        for statement in migration.statements:
+            conn.execute(text(statement))
+        conn.execute(
+            insert(SchemaVersion).values(
+                version=migration.version,
+                name=migration.name,
+                applied_at=datetime.now(timezone.utc),
+            )
+        )
+        applied.append(migration.version)
+        if log:
+            log.info(
+                "schema migrated", version=migration.version, migration=migration.name
+            )
+    conn.commit()
+    return applied
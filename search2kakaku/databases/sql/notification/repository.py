@@ -6,6 +6,10 @@ from domain.models.notification import (
     notification as m_notif,
     command as m_command,
 )
+from domain.models.pricelog import pricelog as m_pricelog
+
+# SQLite のバインド変数上限を超えないように IN 句を分割する
+MAX_IN_CLAUSE_SIZE = 500
 
 
 class URLNotificationRepository(m_repository.IURLNotificationRepository):
@@ -164,3 +168,50 @@ class URLUpdateParameterRepository(m_repository.IURLUpdateParameterRepository):
         if db_urlparams:
             return db_urlparams.all()
         return []
+
+
+class ScrapeTargetRepository(m_repository.IScrapeTargetRepository):
+    session: AsyncSession
+
+    def __init__(self, ses: AsyncSession):
+        self.session = ses
+
+    def _create_stmt(self, command: m_command.ScrapeTargetGetCommand):
+        stmt = (
+            select(
+                m_pricelog.URL.id,
+                m_pricelog.URL.url,
+                m_notif.URLUpdateParameter.sitename,
+                m_notif.URLUpdateParameter.meta,
+            )
+            .select_from(m_pricelog.URL)
+            .join(
+                m_notif.URLNotification,
+                m_pricelog.URL.id == m_notif.URLNotification.url_id,
+            )
+            .outerjoin(
+                m_notif.URLUpdateParameter,
+                m_pricelog.URL.id == m_notif.URLUpdateParameter.url_id,
+            )
+            .order_by(m_pricelog.URL.id)
+        )
+        if command.url_id:
+            stmt = stmt.where(m_pricelog.URL.id == command.url_id)
+        if command.is_active is not None:
+            stmt = stmt.where(m_notif.URLNotification.is_active == command.is_active)
+        return stmt
+
+    async def get(
+        self, command: m_command.ScrapeTargetGetCommand
+    ) -> list[m_notif.ScrapeTarget]:
+        if command.url_ids is None:
+            db = await self.session.execute(self._create_stmt(command))
+            return [m_notif.ScrapeTarget(*row) for row in db.all()]
+
+        results: list[m_notif.ScrapeTarget] = []
+        for i in range(0, len(command.url_ids), MAX_IN_CLAUSE_SIZE):
+            chunk = command.url_ids[i : i + MAX_IN_CLAUSE_SIZE]
+            stmt = self._create_stmt(command).where(m_pricelog.URL.id.in_(chunk))
+            db = await self.session.execute(stmt)
+            results.extend(m_notif.ScrapeTarget(*row) for row in db.all())
+        return results
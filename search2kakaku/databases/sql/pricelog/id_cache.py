@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from domain.models.pricelog import pricelog as m_pricelog
+from common import read_config
+
+
+class IdCache:
+    """
+    Bounded LRU cache from a URL string or a shop name to its id.
+
+    Kept for the lifetime of the process. Only ids of committed rows are put,
+    and URL and Shop rows are never deleted, so a cached id stays valid.
+    Entries are dropped when the rows are written through URLRepository or
+    ShopRepository. max_entries 0 disables the cache.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        # Celery と API で別のスレッドから使われることがある
+        self._lock = threading.Lock()
+
+    def get_many(self, values: list[str]) -> dict[str, int]:
+        ids = {}
+        with self._lock:
+            for value in values:
+                db_id = self._entries.get(value)
+                if db_id is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(value)
+                ids[value] = db_id
+                self.hits += 1
+        return ids
+
+    def put_many(self, ids: dict[str, int]):
+        if not self.max_entries:
+            return
+        with self._lock:
+            for value, db_id in ids.items():
+                self._entries[value] = db_id
+                self._entries.move_to_end(value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, values: list[str]):
+        with self._lock:
+            for value in values:
+                self._entries.pop(value, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_id_caches: dict[str, IdCache] = {}
+_id_caches_lock = threading.Lock()
+
+
+def get_id_cache(model: type[m_pricelog.URL | m_pricelog.Shop]) -> IdCache:
+    name = model.__tablename__
+    if name not in _id_caches:
+        opts = read_config.get_databases().id_cache
+        with _id_caches_lock:
+            if name not in _id_caches:
+                max_entries = (
+                    opts.url_max_entries
+                    if model is m_pricelog.URL
+                    else opts.shop_max_entries
+                )
+                _id_caches[name] = IdCache(max_entries=max_entries)
+    return _id_caches[name]
+
+
+def clear_id_caches():
+    for cache in _id_caches.values():
+        cache.clear()
+
+
+async def fill_id_caches(ses: AsyncSession, url_ids: dict[str, int]):
+    """
+    Fill the caches at the start of a run.
+
+    url_ids are the URLs the run scrapes, which are already known. Shops are
+    few, so all of them are read with one query.
+    """
+    get_id_cache(m_pricelog.URL).put_many(url_ids)
+    shop_cache = get_id_cache(m_pricelog.Shop)
+    if not shop_cache.max_entries:
+        return
+    result = await ses.execute(
+        select(m_pricelog.Shop.name, m_pricelog.Shop.id)
+        .order_by(m_pricelog.Shop.id.desc())
+        .limit(shop_cache.max_entries)
+    )
+    shop_cache.put_many(dict(result.tuples().all()))
@@ -1,11 +1,37 @@
+from datetime import datetime, timezone
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import case, insert, select
 
 from domain.models.pricelog import (
     repository as m_repository,
     pricelog as m_pricelog,
     command as m_command,
 )
+from common import read_config
+from databases.sql import dialect
+from .id_cache import get_id_cache
+
+# IN 句に一度に渡す値の数。SQLite のバインド変数の上限より十分小さくする
+IN_CHUNK_SIZE = 500
+
+
+async def _get_ids(
+    ses: AsyncSession,
+    model: type[m_pricelog.URL | m_pricelog.Shop],
+    key: str,
+    values: list[str],
+) -> dict[str, int]:
+    # キャッシュに無い値のみ、IN_CHUNK_SIZE 件ずつ問い合わせる
+    ids = get_id_cache(model).get_many(values)
+    column = getattr(model, key)
+    rest = [value for value in dict.fromkeys(values) if value not in ids]
+    for i in range(0, len(rest), IN_CHUNK_SIZE):
+        result = await ses.execute(
+            select(column, model.id).where(column.in_(rest[i : i + IN_CHUNK_SIZE]))
+        )
+        ids.update(result.tuples().all())
+    return ids
 
 
 class PriceLogRepository(m_repository.IPriceLogRepository):
@@ -15,35 +41,119 @@ class PriceLogRepository(m_repository.IPriceLogRepository):
         self.session = ses
 
     async def save_all(self, pricelog_entries: list[m_pricelog.PriceLog]):
-        ses = self.session
+        # 行毎に SELECT / flush / refresh せず、まとめて INSERT する
+        # url_id と shop_id は設定するが、id は設定しない
+        if not pricelog_entries:
+            return
+        url_ids = await self._get_or_add_ids(
+            m_pricelog.URL,
+            "url",
+            [pricelog.url.url for pricelog in pricelog_entries if not pricelog.url_id],
+        )
+        shop_ids = await self._get_or_add_ids(
+            m_pricelog.Shop,
+            "name",
+            [
+                pricelog.shop.name
+                for pricelog in pricelog_entries
+                if not pricelog.shop_id
+            ],
+        )
         for pricelog in pricelog_entries:
             if not pricelog.url_id:
-                result = await ses.execute(
-                    select(m_pricelog.URL).where(m_pricelog.URL.url == pricelog.url.url)
-                )
-                url = result.scalar()
-                if url:
-                    pricelog.url = url
+                pricelog.url_id = url_ids[pricelog.url.url]
             if not pricelog.shop_id:
-                result = await ses.execute(
-                    select(m_pricelog.Shop).where(
-                        m_pricelog.Shop.name == pricelog.shop.name
-                    )
-                )
-                shop = result.scalar()
-                if shop:
-                    pricelog.shop = shop
-            ses.add(pricelog)
-            await ses.flush()
+                pricelog.shop_id = shop_ids[pricelog.shop.name]
+        await self._insert(
+            [pricelog.model_dump(exclude={"id"}) for pricelog in pricelog_entries]
+        )
+        await self.session.commit()
+        get_id_cache(m_pricelog.URL).put_many(url_ids)
+        get_id_cache(m_pricelog.Shop).put_many(shop_ids)
 
-        await ses.commit()
-        for pricelog in pricelog_entries:
-            await ses.refresh(pricelog)
+    async def save_rows(self, rows: list[m_pricelog.PriceLogRow]):
+        # ORM オブジェクトを作らず、まとめて INSERT する
+        if not rows:
+            return
+        url_ids = await self._get_or_add_ids(
+            m_pricelog.URL, "url", [row["url"] for row in rows]
+        )
+        shop_ids = await self._get_or_add_ids(
+            m_pricelog.Shop, "name", [row["shop"] for row in rows]
+        )
+        params = []
+        for row in rows:
+            param = dict(row)
+            param["url_id"] = url_ids[param.pop("url")]
+            param["shop_id"] = shop_ids[param.pop("shop")]
+            params.append(param)
+        await self._insert(params)
+        await self.session.commit()
+        # 追加した行の id はコミット後にキャッシュする
+        get_id_cache(m_pricelog.URL).put_many(url_ids)
+        get_id_cache(m_pricelog.Shop).put_many(shop_ids)
 
-    async def get(
-        self, command: m_command.PriceLogGetCommand
-    ) -> list[m_pricelog.PriceLog]:
-        ses = self.session
+    async def _insert(self, params: list[dict]):
+        # PostgreSQL (asyncpg) では COPY で追加する
+        if (
+            read_config.get_databases().storage.postgresql.copy_ingest
+            and dialect.can_copy(self.session)
+        ):
+            await dialect.copy_rows(
+                ses=self.session, table=m_pricelog.PriceLog.__table__, rows=params
+            )
+            return
+        await self.session.execute(insert(m_pricelog.PriceLog), params)
+
+    async def _get_or_add_ids(
+        self,
+        model: type[m_pricelog.URL | m_pricelog.Shop],
+        key: str,
+        values: list[str],
+    ) -> dict[str, int]:
+        """
+        Return the ids of the values, adding the missing ones in one INSERT.
+
+        The values are unique, so a value added by another process at the same
+        time is skipped with ON CONFLICT DO NOTHING and read back afterwards.
+        The new rows are committed with the caller's transaction, so the caller
+        puts the ids in the cache after the commit.
+        """
+        values = list(dict.fromkeys(values))
+        ids = await _get_ids(ses=self.session, model=model, key=key, values=values)
+        missing = [value for value in values if value not in ids]
+        if not missing:
+            return ids
+        column = getattr(model, key)
+        upsert_insert = dialect.get_upsert_insert(self.session)
+        if upsert_insert:
+            stmt = upsert_insert(model).on_conflict_do_nothing(index_elements=[column])
+        else:
+            stmt = insert(model)
+        now = datetime.now(timezone.utc)
+        result = await self.session.execute(
+            stmt.returning(column, model.id),
+            [
+                {
+                    key: value,
+                    "created_at": now,
+                    "updated_at": now,
+                    "is_deleted": False,
+                }
+                for value in missing
+            ],
+        )
+        ids.update(result.tuples().all())
+        conflicted = [value for value in missing if value not in ids]
+        if conflicted:
+            ids.update(
+                await _get_ids(
+                    ses=self.session, model=model, key=key, values=conflicted
+                )
+            )
+        return ids
+
+    def _create_stmt(self, command: m_command.PriceLogGetCommand):
         stmt = select(m_pricelog.PriceLog)
         if command.id:
             stmt = stmt.where(m_pricelog.PriceLog.id == command.id)
@@ -54,7 +164,12 @@ class PriceLogRepository(m_repository.IPriceLogRepository):
             stmt = stmt.where(m_pricelog.PriceLog.created_at >= command.start_utc_date)
         if command.end_utc_date:
             stmt = stmt.where(m_pricelog.PriceLog.created_at <= command.end_utc_date)
-        ret = await ses.execute(stmt)
+        return stmt
+
+    async def get(
+        self, command: m_command.PriceLogGetCommand
+    ) -> list[m_pricelog.PriceLog]:
+        ret = await self.session.execute(self._create_stmt(command))
         results = ret.scalars()
         if not results:
             return []
@@ -69,6 +184,7 @@ class URLRepository(m_repository.IURLRepository):
 
     async def save_all(self, url_entries: list[m_pricelog.URL]):
         ses = self.session
+        values = [url.url for url in url_entries]
         adds = []
         for url in url_entries:
             if not url.id:
@@ -82,9 +198,17 @@ class URLRepository(m_repository.IURLRepository):
                 await ses.flush()
                 adds.append(url)
         await ses.commit()
+        get_id_cache(m_pricelog.URL).invalidate(values)
         for url in adds:
             await ses.refresh(url)
 
+    async def get_ids(self, urls: list[str]) -> dict[str, int]:
+        ids = await _get_ids(
+            ses=self.session, model=m_pricelog.URL, key="url", values=urls
+        )
+        get_id_cache(m_pricelog.URL).put_many(ids)
+        return ids
+
     async def get(self, command: m_command.URLGetCommand) -> m_pricelog.URL | None:
         ses = self.session
         stmt = select(m_pricelog.URL)
@@ -111,6 +235,7 @@ class ShopRepository(m_repository.IShopRepository):
 
     async def save_all(self, shop_entries: list[m_pricelog.Shop]):
         ses = self.session
+        values = [shop.name for shop in shop_entries]
         adds = []
         for shop in shop_entries:
             result = await ses.execute(
@@ -123,9 +248,17 @@ class ShopRepository(m_repository.IShopRepository):
             await ses.flush()
             adds.append(shop)
         await ses.commit()
+        get_id_cache(m_pricelog.Shop).invalidate(values)
         for shop in adds:
             await ses.refresh(shop)
 
+    async def get_ids(self, names: list[str]) -> dict[str, int]:
+        ids = await _get_ids(
+            ses=self.session, model=m_pricelog.Shop, key="name", values=names
+        )
+        get_id_cache(m_pricelog.Shop).put_many(ids)
+        return ids
+
     async def get(self, command: m_command.ShopGetCommand) -> m_repository.Shop | None:
         ses = self.session
         stmt = select(m_pricelog.Shop)
@@ -144,7 +277,9 @@ class CategoryRepository(m_repository.ICategoryRepository):
         self.session = ses
 
     async def save_all(self, cate_entries: list[m_pricelog.Category]):
+        # updated_at は名前が変わらなくても取得日時として更新する
         ses = self.session
+        now = datetime.now(timezone.utc)
         adds = []
         updates = []
         for cate in cate_entries:
@@ -155,9 +290,10 @@ class CategoryRepository(m_repository.ICategoryRepository):
             )
             db_cate = result.scalar()
             if db_cate:
-                if db_cate.name != cate.name:
-                    db_cate.name = cate.name
-                    updates.append(cate)
+                db_cate.name = cate.name
+                db_cate.is_deleted = False
+                db_cate.updated_at = now
+                updates.append(db_cate)
                 continue
             ses.add(cate)
             await ses.flush()
@@ -179,8 +315,78 @@ class CategoryRepository(m_repository.ICategoryRepository):
             stmt = stmt.where(m_pricelog.Category.name == command.name)
         if command.entity_type:
             stmt = stmt.where(m_pricelog.Category.entity_type == command.entity_type)
+        if command.is_deleted is not None:
+            stmt = stmt.where(m_pricelog.Category.is_deleted == command.is_deleted)
         result = await ses.execute(stmt)
         categorys = result.scalars()
         if not categorys:
             return []
         return categorys.all()
+
+
+class ScrapeDigestRepository(m_repository.IScrapeDigestRepository):
+    session: AsyncSession
+
+    def __init__(self, ses: AsyncSession):
+        self.session = ses
+
+    async def save_all(self, digest_entries: list[m_pricelog.ScrapeDigest]):
+        if not digest_entries:
+            return
+        upsert_insert = dialect.get_upsert_insert(self.session)
+        if not upsert_insert:
+            await self._save_all_by_select(digest_entries)
+            return
+        # 複数のプロセスが同じ URL を保存しても一意制約で失敗しないよう、UPSERT する
+        model = m_pricelog.ScrapeDigest
+        stmt = upsert_insert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[model.url_id],
+            set_={
+                "digest": stmt.excluded.digest,
+                "changed_at": case(
+                    (model.digest != stmt.excluded.digest, stmt.excluded.changed_at),
+                    else_=model.changed_at,
+                ),
+                "updated_at": stmt.excluded.updated_at,
+                "seen_count": model.seen_count + 1,
+            },
+        )
+        await self.session.execute(
+            stmt, [digest.model_dump(exclude={"id"}) for digest in digest_entries]
+        )
+        await self.session.commit()
+
+    async def _save_all_by_select(self, digest_entries: list[m_pricelog.ScrapeDigest]):
+        ses = self.session
+        db_digests = {
+            db_digest.url_id: db_digest
+            for db_digest in await self.get(
+                command=m_command.ScrapeDigestGetCommand(
+                    url_ids=[digest.url_id for digest in digest_entries]
+                )
+            )
+        }
+        for digest in digest_entries:
+            db_digest = db_digests.get(digest.url_id)
+            if not db_digest:
+                ses.add(digest)
+                continue
+            if db_digest.digest != digest.digest:
+                db_digest.digest = digest.digest
+                db_digest.changed_at = digest.changed_at
+            db_digest.updated_at = digest.updated_at
+            db_digest.seen_count += 1
+        await ses.commit()
+
+    async def get(
+        self, command: m_command.ScrapeDigestGetCommand
+    ) -> list[m_pricelog.ScrapeDigest]:
+        if not command.url_ids:
+            return []
+        result = await self.session.execute(
+            select(m_pricelog.ScrapeDigest).where(
+                m_pricelog.ScrapeDigest.url_id.in_(command.url_ids)
+            )
+        )
+        return result.scalars().all()
@@ -1,25 +1,76 @@
 from sqlmodel import SQLModel, create_engine
-from sqlalchemy import URL
+from sqlalchemy import URL, Engine, event
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
     create_async_engine,
     async_sessionmaker,
 )
 
 from common import read_config
+from databases.sql import migration
+
+
+def is_sqlite(params: read_config.SQLParams) -> bool:
+    return "sqlite" in params.drivername
+
+
+def get_engine_params(
+    params: read_config.SQLParams, storage: read_config.StorageOptions
+) -> dict:
+    sub_params = {
+        "echo": False,
+    }
+    if is_sqlite(params):
+        sub_params["connect_args"] = {"check_same_thread": False}
+    sub_params.update(storage.pool.model_dump(exclude_none=True))
+    return sub_params
+
+
+def set_sqlite_pragmas(engine: Engine, opts: read_config.SQLitePragmaOptions):
+    # PRAGMA は接続毎の設定のため、新しい接続を作る度に実行する
+    pragmas = opts.model_dump(exclude_none=True)
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
 
-databases = read_config.get_databases()
-sync_db_params = URL.create(**databases.sync.model_dump(exclude_none=True))
-async_db_params = URL.create(**databases.a_sync.model_dump(exclude_none=True))
 
-sub_params = {
-    "echo": False,
-}
-if "sqlite" in databases.sync.drivername or "sqlite" in databases.a_sync.drivername:
-    sub_params["connect_args"] = {"check_same_thread": False}
+def create_db_engine(
+    params: read_config.SQLParams, storage: read_config.StorageOptions
+) -> Engine:
+    engine = create_engine(
+        URL.create(**params.model_dump(exclude_none=True)),
+        **get_engine_params(params=params, storage=storage),
+    )
+    if is_sqlite(params):
+        set_sqlite_pragmas(engine=engine, opts=storage.sqlite)
+    return engine
+
+
+def create_async_db_engine(
+    params: read_config.SQLParams, storage: read_config.StorageOptions
+) -> AsyncEngine:
+    async_engine = create_async_engine(
+        URL.create(**params.model_dump(exclude_none=True)),
+        **get_engine_params(params=params, storage=storage),
+    )
+    if is_sqlite(params):
+        set_sqlite_pragmas(engine=async_engine.sync_engine, opts=storage.sqlite)
+    return async_engine
 
-engine = create_engine(sync_db_params, **sub_params)
 
-async_engine = create_async_engine(async_db_params, **sub_params)
+databases = read_config.get_databases()
+
+engine = create_db_engine(params=databases.sync, storage=databases.storage)
+
+async_engine = create_async_db_engine(
+    params=databases.a_sync, storage=databases.storage
+)
 aSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=async_engine)
 
 
@@ -30,11 +81,15 @@ async def get_async_session():
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    with engine.connect() as conn:
+        migration.upgrade(conn)
 
 
 async def create_async_db_and_tables():
     async with async_engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+    async with async_engine.connect() as conn:
+        await conn.run_sync(migration.upgrade)
 
 
 def get_engine():
@@ -1,5 +1,5 @@
 from sqlmodel import Field
-from sqlalchemy import JSON, Column
+from sqlalchemy import JSON, Column, Index
 from sqlalchemy.ext.mutable import MutableDict
 
 from domain.models.base_model import SQLBase
@@ -7,9 +7,20 @@ from common import enums
 
 
 class ActivityLog(SQLBase, table=True):
+    # 既存のデータベースには databases/sql/migration.py で追加する
+    __table_args__ = (
+        Index(
+            "ix_activitylog_activity_type_current_state_updated_at",
+            "activity_type",
+            "current_state",
+            "updated_at",
+        ),
+        Index("ix_activitylog_target_table_target_id", "target_table", "target_id"),
+    )
+
     target_id: str
     target_table: str
-    activity_type: str = Field(index=True)
+    activity_type: str
     current_state: str = Field(default=enums.OrderStatus.PENDING.name, index=True)
     caller_type: str
     meta: dict = Field(
@@ -13,3 +13,8 @@ class ActivityLogGetCommand(BaseModel):
     is_error: bool = False
     updated_at_start: datetime | None = None
     updated_at_end: datetime | None = None
+
+
+class ActivityLogDeleteCommand(BaseModel):
+    activity_types: list[str]
+    updated_at_end: datetime
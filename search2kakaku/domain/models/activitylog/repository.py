@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from .activitylog import ActivityLog
-from .command import ActivityLogGetCommand
+from .command import ActivityLogGetCommand, ActivityLogDeleteCommand
 
 
 class IActivityLogRepository(ABC):
@@ -11,3 +11,7 @@ class IActivityLogRepository(ABC):
     @abstractmethod
     async def get(self, command: ActivityLogGetCommand) -> list[ActivityLog]:
         pass
+
+    @abstractmethod
+    async def delete(self, command: ActivityLogDeleteCommand) -> int:
+        pass
@@ -9,3 +9,9 @@ class URLNotificationGetCommand(BaseModel):
 class URLUpdateParameterGetCommand(BaseModel):
     url_id: int | None = None
     sitename: str | None = None
+
+
+class ScrapeTargetGetCommand(BaseModel):
+    url_id: int | None = None
+    url_ids: list[int] | None = None
+    is_active: bool | None = True
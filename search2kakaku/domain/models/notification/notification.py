@@ -1,3 +1,5 @@
+from typing import NamedTuple
+
 from sqlmodel import Field
 from sqlalchemy import JSON, Column
 from sqlalchemy.ext.mutable import MutableDict
@@ -16,3 +18,11 @@ class URLUpdateParameter(SQLBase, table=True):
     meta: dict = Field(
         default_factory=dict, sa_column=Column(MutableDict.as_mutable(JSON))
     )
+
+
+class ScrapeTarget(NamedTuple):
+    # 更新対象の URL と取得用のパラメータ (URL, URLNotification, URLUpdateParameter)
+    url_id: int
+    url: str
+    sitename: str | None
+    meta: dict | None
@@ -1,6 +1,10 @@
 from abc import ABC, abstractmethod
-from .notification import URLNotification, URLUpdateParameter
-from .command import URLNotificationGetCommand, URLUpdateParameterGetCommand
+from .notification import URLNotification, URLUpdateParameter, ScrapeTarget
+from .command import (
+    URLNotificationGetCommand,
+    URLUpdateParameterGetCommand,
+    ScrapeTargetGetCommand,
+)
 
 
 class IURLNotificationRepository(ABC):
@@ -27,3 +31,9 @@ class IURLUpdateParameterRepository(ABC):
         command: URLUpdateParameterGetCommand,
     ) -> list[URLUpdateParameter]:
         pass
+
+
+class IScrapeTargetRepository(ABC):
+    @abstractmethod
+    async def get(self, command: ScrapeTargetGetCommand) -> list[ScrapeTarget]:
+        pass
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class PriceLogGetCommand(BaseModel):
@@ -25,3 +25,8 @@ class CategoryGetCommand(BaseModel):
     category_id: str = ""
     name: str = ""
     entity_type: str = ""
+    is_deleted: bool | None = None
+
+
+class ScrapeDigestGetCommand(BaseModel):
+    url_ids: list[int] = Field(default_factory=list)
@@ -1,5 +1,8 @@
+from datetime import datetime, timezone
+from typing import TypedDict
+
 from sqlmodel import Field, Relationship
-from sqlalchemy import JSON, Column
+from sqlalchemy import JSON, Column, Index
 from sqlalchemy.ext.mutable import MutableDict
 
 from domain.models.base_model import SQLBase
@@ -8,18 +11,22 @@ from common import constants
 
 
 class URL(SQLBase, table=True):
-    url: str = Field(default="", index=True)
+    # 一意インデックスは既存のデータベースには databases/sql/migration.py で追加する
+    url: str = Field(default="", unique=True, index=True)
 
     logs: list["PriceLog"] = Relationship(back_populates="url")
 
 
 class Shop(SQLBase, table=True):
-    name: str = Field(index=True)
+    name: str = Field(unique=True, index=True)
 
     logs: list["PriceLog"] = Relationship(back_populates="shop")
 
 
 class PriceLog(SQLBase, table=True):
+    # 既存のデータベースには databases/sql/migration.py で追加する
+    __table_args__ = (Index("ix_pricelog_url_id_created_at", "url_id", "created_at"),)
+
     title: str
     price: int
     condition: str
@@ -42,7 +49,37 @@ class PriceLog(SQLBase, table=True):
     shop: Shop | None = Relationship(back_populates="logs")
 
 
+class PriceLogRow(TypedDict):
+    # PriceLog を一括で INSERT するための行。url と shop は保存時に id に置き換える
+    title: str
+    price: int
+    condition: str
+    on_sale: bool
+    salename: str
+    is_success: bool
+    image_url: str
+    stock_msg: str
+    point: int
+    stock_quantity: int
+    used_list_url: str
+    sub_price: int
+    others: dict
+    created_at: datetime
+    updated_at: datetime
+    is_deleted: bool
+    url: str
+    shop: str
+
+
 class Category(SQLBase, table=True):
     category_id: str = Field(index=True)
     name: str = Field(index=True)
     entity_type: str
+
+
+class ScrapeDigest(SQLBase, table=True):
+    # updated_at は最後に取得した日時
+    url_id: int = Field(foreign_key="url.id", unique=True, index=True)
+    digest: str
+    changed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    seen_count: int = Field(default=1)
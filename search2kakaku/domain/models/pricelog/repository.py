@@ -1,12 +1,13 @@
 from abc import ABC, abstractmethod
 
 
-from .pricelog import PriceLog, URL, Shop, Category
+from .pricelog import PriceLog, PriceLogRow, URL, Shop, Category, ScrapeDigest
 from .command import (
     PriceLogGetCommand,
     ShopGetCommand,
     URLGetCommand,
     CategoryGetCommand,
+    ScrapeDigestGetCommand,
 )
 
 
@@ -15,6 +16,10 @@ class IPriceLogRepository(ABC):
     async def save_all(self, pricelog_entries: list[PriceLog]):
         pass
 
+    @abstractmethod
+    async def save_rows(self, rows: list[PriceLogRow]):
+        pass
+
     @abstractmethod
     async def get(self, command: PriceLogGetCommand) -> list[PriceLog]:
         pass
@@ -33,6 +38,10 @@ class IURLRepository(ABC):
     async def get_all(self) -> list[URL]:
         pass
 
+    @abstractmethod
+    async def get_ids(self, urls: list[str]) -> dict[str, int]:
+        pass
+
 
 class IShopRepository(ABC):
     @abstractmethod
@@ -43,6 +52,10 @@ class IShopRepository(ABC):
     async def get(self, command: ShopGetCommand) -> Shop | None:
         pass
 
+    @abstractmethod
+    async def get_ids(self, names: list[str]) -> dict[str, int]:
+        pass
+
 
 class ICategoryRepository(ABC):
 
@@ -53,3 +66,14 @@ class ICategoryRepository(ABC):
     @abstractmethod
     async def get(self, command: CategoryGetCommand) -> list[Category]:
         pass
+
+
+class IScrapeDigestRepository(ABC):
+
+    @abstractmethod
+    async def save_all(self, digest_entries: list[ScrapeDigest]):
+        pass
+
+    @abstractmethod
+    async def get(self, command: ScrapeDigestGetCommand) -> list[ScrapeDigest]:
+        pass
@@ -84,3 +84,8 @@ class KakakuListContext(BaseModel):
     error_msgs: list[str] = Field(default_factory=list)
     to_link: bool = Field(default=False)
     active_filter: str | None = Field(default=None)
+
+
+class ConfigReloadResponse(BaseModel):
+    reloaded: bool = Field(..., description="設定を読み直したかどうか")
+    error_msg: str | None = Field(None, description="エラーメッセージ")
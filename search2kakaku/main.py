@@ -3,6 +3,7 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, status, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
+import structlog
 
 
 from routers.api import api_router
@@ -10,6 +11,8 @@ from routers.html.urls import router as html_router
 from routers.html.kakaku import router as kakaku_router
 from databases.sql.create_db import create_db
 from common.logger_config import configure_logger
+from common.read_config import install_reload_signal_handler
+from app.getdata import http_client_lifespan, search_cache_lifespan
 
 configure_logger(filename="app.log", logging_level="INFO")
 
@@ -17,7 +20,9 @@ configure_logger(filename="app.log", logging_level="INFO")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_db()
-    yield
+    install_reload_signal_handler(log=structlog.get_logger(__name__))
+    async with http_client_lifespan(), search_cache_lifespan():
+        yield
 
 
 app = FastAPI(lifespan=lifespan)
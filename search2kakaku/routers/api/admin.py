@@ -0,0 +1,26 @@
+import uuid
+
+from fastapi import APIRouter, HTTPException, status
+import structlog
+
+from common import read_config
+from domain.schemas import schemas
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.post("/config/reload", response_model=schemas.ConfigReloadResponse)
+async def reload_config_api():
+    run_id = str(uuid.uuid4())
+    log = structlog.get_logger(__name__).bind(run_id=run_id, process_type="api_request")
+    try:
+        read_config.reload_config()
+    except Exception as e:
+        log.error("reload config failed", error=e)
+        # 読み直しに失敗した場合は前の設定のまま動き続ける
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"failed to reload config, type:{type(e).__name__}, {e}",
+        )
+    log.info("reload config")
+    return schemas.ConfigReloadResponse(reloaded=True)
@@ -10,6 +10,7 @@ from app.sofmap import (
     web_scraper as sofmap_scraper,
     enums as sofmap_enums,
     models as sofmap_models,
+    category as sofmap_category,
 )
 from app.geo import web_scraper as geo_scraper
 from app.iosys import (
@@ -21,8 +22,8 @@ from databases.sql.pricelog import repository as db_repo
 from databases.sql import util as db_util
 from databases.sql.create_db import create_db
 from common import logger_config
-from app.getdata import get_search_info
-from app.getdata.models import info as info_model, search as search_model
+from app.getdata import http_client_lifespan, search_cache_lifespan
+from app.getdata.models import search as search_model
 from app.enums import SiteName
 
 
@@ -136,6 +137,11 @@ def sofmap_argparse(subparsers):
         action="store_true",
         help="検索対象のカテゴリ一覧を表示します。このオプションを指定した場合、検索はされません。",
     )
+    sofmap_parser.add_argument(
+        "--refresh_categories",
+        action="store_true",
+        help="保存済みのカテゴリ一覧を破棄し、サイトから取得し直します。キーワードを指定しない場合、検索はされません。",
+    )
     CONDITIONS = [pt.name for pt in sofmap_enums.ProductTypeOptions]
     sofmap_parser.add_argument(
         "-co",
@@ -179,56 +185,36 @@ def sofmap_argparse(subparsers):
     )
 
 
-async def get_category_list(
-    sitename: str,
-    is_akiba: bool,
-) -> list[dict]:
-    inforeq = info_model.InfoRequest(
-        sitename=sitename, infoname="category", options={"is_akiba": is_akiba}
-    )
-    ok, result = await get_search_info(inforeq=inforeq)
-    if ok and isinstance(result, info_model.InfoResponse):
-        return [r.model_dump() for r in result.results]
-    return []
-
-
-async def get_category_id(
-    sitename: str,
-    is_akiba: bool,
-    category_name: str,
-) -> str:
-    if not category_name:
-        return ""
-    result = await get_category_list(sitename=sitename, is_akiba=is_akiba)
-    if not result:
-        return ""
-    for r in result:
-        if r["name"] == category_name:
-            return r["gid"]
-    return ""
-
-
-async def save_result(ses: AsyncSession, pricelog_list: list[m_pricelog.PriceLog]):
+async def save_result(ses: AsyncSession, pricelog_list: list[m_pricelog.PriceLogRow]):
     pricelogrepo = db_repo.PriceLogRepository(ses=ses)
-    await pricelogrepo.save_all(pricelog_entries=pricelog_list)
+    await pricelogrepo.save_rows(rows=pricelog_list)
 
 
 async def sofmap_command(argp, log):
     async for ses in db_util.get_async_session():
         if argp.categorylist:
-            category_list = await get_category_list(
-                sitename=SiteName.SOFMAP.value,
+            category_list = await sofmap_category.get_category_list(
+                ses=ses,
                 is_akiba=argp.akiba,
+                refresh=argp.refresh_categories,
+                log=log,
             )
             log.info(category_list)
             return
+        if argp.refresh_categories and not argp.search_query:
+            await sofmap_category.refresh_categories(
+                ses=ses, is_akiba=argp.akiba, log=log
+            )
+            return
         if not argp.search_query:
             log.info("paramter error. search_query is None")
             return
-        gid = await get_category_id(
-            sitename=SiteName.SOFMAP.value,
+        gid = await sofmap_category.get_category_id(
+            ses=ses,
             is_akiba=argp.akiba,
             category_name=argp.category,
+            refresh=argp.refresh_categories,
+            log=log,
         )
         log.info("get parameter", gid=gid, **vars(argp))
         searchoptions = sofmap_models.SofmapSearchDataOptions(
@@ -357,15 +343,16 @@ async def main():
 
     argp = set_argparse()
     create_db()
-    match argp.sitename:
-        case SiteName.SOFMAP.value:
-            await sofmap_command(argp=argp, log=log)
-        case SiteName.GEO.value:
-            await geo_command(argp=argp, log=log)
-        case SiteName.IOSYS.value:
-            await iosys_command(argp=argp, log=log)
-        case _:
-            raise ValueError("invalid sitename")
+    async with http_client_lifespan(), search_cache_lifespan():
+        match argp.sitename:
+            case SiteName.SOFMAP.value:
+                await sofmap_command(argp=argp, log=log)
+            case SiteName.GEO.value:
+                await geo_command(argp=argp, log=log)
+            case SiteName.IOSYS.value:
+                await iosys_command(argp=argp, log=log)
+            case _:
+                raise ValueError("invalid sitename")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,12 @@
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
+# PostgreSQL (required to run several Celery workers on one database):
+#     "sync": {"drivername": "postgresql+psycopg", "host": "postgres",
+#              "port": "5432", "username": "search2kakaku",
+#              "password": "search2kakaku", "database": "search2kakaku"},
+#     "a_sync": {"drivername": "postgresql+asyncpg", ...same as sync...},
+# See compose_sample/compose.postgres.yaml.
 DATABASES = {
     "sync": {
         "drivername": "sqlite",
@@ -10,6 +16,31 @@ DATABASES = {
         "drivername": "sqlite+aiosqlite",
         "database": f"{BASE_DIR}/db/database.db",
     },
+    # Per-process LRU cache of URL and Shop ids used when saving PriceLog rows.
+    # 0 disables it.
+    "id_cache": {"url_max_entries": 10000, "shop_max_entries": 1000},
+    # Storage profile. "sqlite" pragmas are run on every new connection (None or
+    # missing keeps the SQLite default). WAL lets the API, Celery and CLI read
+    # while another process writes, and synchronous "normal" syncs only at
+    # checkpoints in WAL mode. cache_size < 0 is in KiB. busy_timeout is in ms.
+    # "postgresql": copy_ingest adds PriceLog rows with COPY (asyncpg only).
+    # "pool" is passed to the SQLAlchemy engines (both sync and async).
+    "storage": {
+        "sqlite": {
+            "journal_mode": "wal",
+            "synchronous": "normal",
+            "mmap_size": 268435456,
+            "cache_size": -65536,
+            "busy_timeout": 10000,
+        },
+        "postgresql": {"copy_ingest": True},
+        "pool": {
+            "pool_size": 5,
+            "max_overflow": 10,
+            "pool_timeout": 30.0,
+            "pool_recycle": 3600,
+        },
+    },
 }
 API_OPTIONS = {
     "get_data": {
@@ -18,6 +49,61 @@ API_OPTIONS = {
         "sofmap": {"timeout": 17.0},
         "geo": {"timeout": 18.0},
         "gemini": {"timeout": 300.0},
+        # Hedged requests: when a search has not answered within the site's observed
+        # latency percentile (at least min_delay seconds, after min_samples calls),
+        # send the same request again and use the first successful response.
+        # Extra requests are limited to max_extra_ratio of all requests.
+        "hedging": {
+            "enable": False,
+            "percentile": 0.9,
+            "min_samples": 20,
+            "min_delay": 1.0,
+            "max_extra_ratio": 0.1,
+            "exclude_sites": ["gemini"],
+        },
+        # Shared HTTP client for searches. Connections are kept alive and reused.
+        # http2 uses the h2 package installed with httpx[http2] (requirements.txt).
+        "client": {
+            "max_connections": 20,
+            "max_keepalive_connections": 10,
+            "keepalive_expiry": 30.0,
+            "http2": False,
+        },
+        # Seconds to use the category list saved in the Category table
+        # before getting it from the API again.
+        "category_cache": {"ttl": 86400.0},
+        # Cache of search responses. backend is "memory" (per process) or "redis"
+        # (REDIS_OPTIONS). ttl is in seconds, site_ttl overrides it per sitename
+        # (0 disables caching for the site). Scheduled updates do not use the cache.
+        "cache": {
+            "enable": True,
+            "backend": "memory",
+            "max_entries": 1000,
+            "ttl": 300.0,
+            "site_ttl": {"gemini": 3600.0},
+        },
+        # Batch calls: searches of the same site started within window seconds are
+        # sent in one call of up to max_batch_size requests. Used only when the API
+        # advertises it (capabilities/, checked every probe_interval seconds),
+        # otherwise each search is sent on its own. concurrency is the number of
+        # searches the API runs at once in a batch; the batch timeout is the site
+        # timeout times ceil(batch size / concurrency). A batch that times out is
+        # sent again one search at a time.
+        # Batching happens after rate limiting, so it only groups searches that are
+        # in flight at the same time: concurrent CLI/API callers, or a scheduled update
+        # whose UPDATE_URL_OPTIONS domain_limits allow several requests within window
+        # (concurrency and burst > 1, or rate 0). With the default domain_limits, e.g.
+        # sofmap at 0.5 requests per second, scheduled updates send almost every
+        # search on its own.
+        "batch": {
+            "enable": False,
+            "max_batch_size": 20,
+            "concurrency": 4,
+            "window": 0.05,
+            "probe_interval": 3600.0,
+            "probe_timeout": 5.0,
+            "exclude_sites": ["gemini"],
+        },
     },
     "post_data": {
         "url": "http://localhost:8000/api/",
@@ -30,7 +116,85 @@ UPDATE_URL_OPTIONS = {
         # "convert_to_direct_search": False,
         # "remove_duplicates": True,
     },
-    "excution_strategy": "sequential",  # "parallel" or "sequential"
+    "excution_strategy": "domain",  # "domain", "parallel" or "sequential"
+    # Used by "domain" strategy. Keys are default, sofmap, a_sofmap, geo, iosys, gemini.
+    # concurrency: workers per domain, rate: requests per second (0 is unlimited),
+    # burst: requests allowed back to back before rate applies.
+    # adaptive: adjust concurrency between min_concurrency and max_concurrency (AIMD),
+    # halving it on errors or when p95 latency exceeds max_p95_latency seconds.
+    "domain_limits": {
+        "default": {"concurrency": 1, "rate": 0.5, "burst": 1},
+        "sofmap": {
+            "concurrency": 2,
+            "rate": 0.5,
+            "burst": 2,
+            "adaptive": True,
+            "max_concurrency": 4,
+            "max_p95_latency": 10.0,
+        },
+        "a_sofmap": {"concurrency": 2, "rate": 0.5, "burst": 2},
+        "geo": {
+            "concurrency": 1,
+            "rate": 0.25,
+            "burst": 1,
+            "adaptive": True,
+            "max_concurrency": 2,
+            "max_p95_latency": 10.0,
+        },
+        "iosys": {"concurrency": 1, "rate": 0.5, "burst": 1},
+        "gemini": {"concurrency": 1, "rate": 0, "burst": 1},
+    },
+    # Skip URLs whose price/stock rarely changes, estimated from PriceLog history.
+    # A URL is scraped when it has fewer than min_observations past scrapes, was last
+    # scraped max_age_hours ago or more, or its change probability since then is at
+    # least min_change_probability.
+    "prioritization": {
+        "enable": False,
+        "history_days": 30,
+        "min_observations": 3,
+        "min_change_probability": 0.2,
+        "max_age_hours": 72,
+    },
+    # Per site circuit breaker. After failure_threshold consecutive failures the
+    # remaining URLs of the site fail immediately; after cooldown seconds one URL is
+    # tried again and a success resumes the site. Only transport errors, timeouts and
+    # 5xx/429 responses are failures; errors of a URL (not found, no result) are not.
+    "circuit_breaker": {
+        "enable": True,
+        "failure_threshold": 5,
+        "cooldown": 60.0,
+    },
+    # Gemini URLs are scraped in a separate lane with its own ActivityLog, so slow LLM
+    # scrapes do not hold up the other sites. The lane uses domain_limits["gemini"].
+    # daily_quota is the maximum Gemini scrapes per day (0 is unlimited); the rest
+    # are left for the next run.
+    "gemini_lane": {
+        "enable": True,
+        "daily_quota": 100,
+    },
+    # Each run saves one checkpoint ActivityLog per URL so an interrupted run can be
+    # resumed. Checkpoints older than this are deleted when a new run starts, so a run
+    # older than this is resumed from the beginning. At least 1 day, as the Gemini
+    # daily_quota counts today's checkpoints.
+    "checkpoint_retention_days": 7,
+    # Scraped PriceLog rows are saved by one writer task. A batch is committed when it
+    # reaches batch_rows rows or flush_interval seconds after its first result.
+    # queue_size limits the scraped results waiting to be saved.
+    # skip_unchanged: do not save PriceLog rows when the result of a URL is the same
+    # as the previous scrape (only the last seen time is updated). send_log only sends
+    # new PriceLog rows, so with this enabled kakakuscraping-fastapi gets nothing for
+    # an unchanged URL and its price is no longer shown as recently checked. Enable
+    # it only when the PriceLog rows are not sent to the API.
+    "writer": {
+        "batch_rows": 500,
+        "flush_interval": 2.0,
+        "queue_size": 100,
+        "skip_unchanged": False,
+    },
+    # Parse search responses as they arrive and pass the rows to the writer in
+    # chunks of chunk_size, so a large response is not held in memory at once.
+    # Streaming does not use hedging or batch calls.
+    "streaming": {"enable": False, "chunk_size": 50},
 }
 REDIS_OPTIONS = {
     "host": "redis",
@@ -41,6 +205,15 @@ AUTO_UPDATE_OPTIONS = {
     "enable": True,
     "schedule": {"hour": 14},
     "notify_to_api": False,
+    # URLs per celery subtask. Batches of the same domain are split into at most
+    # domain_parallelism chains that run at once; batches in a chain run one after
+    # another. Each chain gets 1/n of the domain's concurrency and rate in
+    # UPDATE_URL_OPTIONS["domain_limits"], and n is capped at the domain's maximum
+    # concurrency, so the site never gets more than its limit. Subtasks running at
+    # once are therefore at most (number of domains) x domain_parallelism,
+    # whatever the number of workers.
+    "batch_size": 50,
+    "domain_parallelism": 2,
 }
 HTML_OPTIONS = {
     "kakaku": {
@@ -1,11 +1,14 @@
 import asyncio
 
-from celery import Celery
+from celery import Celery, chain, chord
 from celery.schedules import crontab
+from celery.signals import worker_process_shutdown
 
 from databases.sql import util as db_util
 from app.update import scraping_urls
+from app.update.scheduler import DomainScheduler, get_max_parts
 from app.notification import send_pricelog
+from app.getdata import close_client, close_search_cache
 from common import read_config
 
 redisoptions = read_config.get_redis_options()
@@ -28,20 +31,199 @@ app.conf.timezone = "Asia/Tokyo"  # タイムゾーンの設定
 CALLER_TYPE = "celery"
 
 
-async def a_update_urls_and_notify_to_api():
+_loop: asyncio.AbstractEventLoop | None = None
+
+
+def run_async(coro):
+    # ワーカープロセス毎に1つのイベントループを使い続け、タスク間で接続プールを再利用する
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coro)
+
+
+async def _close_connections():
+    await close_client()
+    await close_search_cache()
+    await db_util.get_async_engine().dispose()
+
+
+@worker_process_shutdown.connect
+def close_connections(**kwargs):
+    global _loop
+    if _loop is None or _loop.is_closed():
+        return
+    try:
+        _loop.run_until_complete(_close_connections())
+    finally:
+        _loop.close()
+        _loop = None
+
+
+def split_into_batches(url_ids: list[int], batch_size: int) -> list[list[int]]:
+    return [url_ids[i : i + batch_size] for i in range(0, len(url_ids), batch_size)]
+
+
+def create_domain_chains(run_dict: dict, domain_key: str, batches: list[list[int]]):
+    # 同じドメインのバッチは最大 domain_parallelism 本のチェーンで同時に実行する。
+    # 各チェーンはドメインの制限を本数で割った値を使い、ワーカー間でも制限を超えない
+    limit = DomainScheduler(
+        limits=read_config.get_update_url_options().domain_limits
+    ).get_base_limit(domain_key)
+    parts = min(autoupdate_opts.domain_parallelism, get_max_parts(limit), len(batches))
+    chains = []
+    for i in range(parts):
+        chain_batches = batches[i::parts]
+        chains.append(
+            chain(
+                scrape_url_batch.s(
+                    None, run_dict, domain_key, chain_batches[0], limit_parts=parts
+                ),
+                *[
+                    scrape_url_batch.s(run_dict, domain_key, batch, limit_parts=parts)
+                    for batch in chain_batches[1:]
+                ],
+            )
+        )
+    return chains
+
+
+async def a_start_update(
+    resume_activitylog_id: int | None = None,
+) -> tuple[scraping_urls.ScrapingRun | None, scraping_urls.ScrapingRun | None]:
+    run = None
+    lane = None
+    async for ses in db_util.get_async_session():
+        run = await scraping_urls.start_scraping_run(
+            ses=ses,
+            caller_type=CALLER_TYPE,
+            resume_activitylog_id=resume_activitylog_id,
+        )
+        if run:
+            lane = await scraping_urls.start_gemini_lane(ses=ses, run=run)
+    return run, lane
+
+
+async def a_scrape_url_batch(
+    run: scraping_urls.ScrapingRun,
+    domain_key: str,
+    url_ids: list[int],
+    breaker_states: dict | None = None,
+    limit_parts: int = 1,
+):
+    batch_result = None
     async for ses in db_util.get_async_session():
-        await scraping_urls.scraping_and_save_target_urls(
-            ses=ses, caller_type=CALLER_TYPE
+        batch_result = await scraping_urls.scrape_url_ids_by_domain(
+            ses=ses,
+            url_ids_by_domain={domain_key: url_ids},
+            run=run,
+            breaker_states=breaker_states,
+            limit_parts=limit_parts,
         )
-        if not autoupdate_opts.notify_to_api:
-            return
+    return batch_result
+
+
+async def a_notify_to_api(ses):
+    if autoupdate_opts.notify_to_api:
         await send_pricelog.send_target_URLs_to_api(
-            ses=ses, start_utc_date=None, end_utc_date=None, caller_type=CALLER_TYPE
+            ses=ses,
+            start_utc_date=None,
+            end_utc_date=None,
+            caller_type=CALLER_TYPE,
+        )
+
+
+async def a_finish_update_and_notify_to_api(
+    run: scraping_urls.ScrapingRun, batch_result: scraping_urls.ScrapingBatchResult
+):
+    async for ses in db_util.get_async_session():
+        await scraping_urls.finish_scraping_run(
+            ses=ses, run=run, batch_result=batch_result
+        )
+        await a_notify_to_api(ses=ses)
+
+
+async def a_scrape_gemini_lane_and_notify_to_api(lane: scraping_urls.ScrapingRun):
+    await scraping_urls.scrape_gemini_lane(lane=lane)
+    async for ses in db_util.get_async_session():
+        await a_notify_to_api(ses=ses)
+
+
+@app.task
+def scrape_url_batch(
+    previous: dict | None,
+    run: dict,
+    domain_key: str,
+    url_ids: list[int],
+    limit_parts: int = 1,
+):
+    accumulated = scraping_urls.ScrapingBatchResult(**(previous or {}))
+    try:
+        batch_result = run_async(
+            a_scrape_url_batch(
+                run=scraping_urls.ScrapingRun(**run),
+                domain_key=domain_key,
+                url_ids=url_ids,
+                # 同じドメインの前のバッチのサーキットブレーカーの状態を引き継ぐ
+                breaker_states=accumulated.breaker_states,
+                limit_parts=limit_parts,
+            )
+        )
+    except Exception as e:
+        batch_result = scraping_urls.ScrapingBatchResult(
+            results=[
+                {
+                    "url_id": url_id,
+                    "ok": False,
+                    "msg": f"batch failed, type:{type(e).__name__}, {e}",
+                }
+                for url_id in url_ids
+            ]
         )
+    accumulated.merge(batch_result)
+    return accumulated.model_dump(mode="json")
 
 
 @app.task
-def update_urls_and_notify_to_api():
+def finish_update_and_notify_to_api(batch_results: list[dict], run: dict):
+    merged = scraping_urls.ScrapingBatchResult()
+    for batch_result in batch_results:
+        merged.merge(scraping_urls.ScrapingBatchResult(**batch_result))
+    run_async(
+        a_finish_update_and_notify_to_api(
+            run=scraping_urls.ScrapingRun(**run), batch_result=merged
+        )
+    )
+
+
+@app.task
+def scrape_gemini_lane_and_notify_to_api(lane: dict):
+    run_async(
+        a_scrape_gemini_lane_and_notify_to_api(lane=scraping_urls.ScrapingRun(**lane))
+    )
+
+
+@app.task
+def update_urls_and_notify_to_api(resume_activitylog_id: int | None = None):
     if not autoupdate_opts.enable:
         return
-    asyncio.run(a_update_urls_and_notify_to_api())
+    run, lane = run_async(a_start_update(resume_activitylog_id=resume_activitylog_id))
+    if not run:
+        return
+    # Gemini は時間がかかるため、他のサイトとは別のタスクで実行する
+    if lane:
+        scrape_gemini_lane_and_notify_to_api.delay(lane.model_dump(mode="json"))
+    run_dict = run.model_dump(mode="json")
+    domain_chains = []
+    for domain_key, url_ids in run.url_ids_by_domain.items():
+        batches = split_into_batches(url_ids, autoupdate_opts.batch_size)
+        domain_chains.extend(
+            create_domain_chains(
+                run_dict=run_dict, domain_key=domain_key, batches=batches
+            )
+        )
+    callback = finish_update_and_notify_to_api.s(run=run_dict)
+    if not domain_chains:
+        callback.delay([])
+        return
+    chord(domain_chains)(callback)
@@ -0,0 +1,140 @@
+"""
+Compare the PriceLog row converter with building ORM objects.
+
+    python -m tools.bench_convert --results 5000 --save
+
+Converts the same generated search results with both paths and prints the best
+time and the peak memory of each. With --save, the converted results are also
+saved to a temporary SQLite database, by PriceLogRepository.save_all for the
+ORM objects and by save_rows for the rows.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from app.enums import SiteName
+from app.getdata.db_convert import searchresults_to_rows
+from app.getdata.models import search as search_model
+from databases.sql.pricelog import repository as p_repo
+from domain.models.pricelog import pricelog as m_pricelog
+
+
+def create_results(count: int, urls: int) -> search_model.SearchResults:
+    return search_model.SearchResults(
+        results=[
+            search_model.SearchResult(
+                title=f"item {i}",
+                price=1000 + i,
+                condition="中古",
+                is_success=True,
+                url=f"https://www.sofmap.com/product_detail.aspx?sku={i % urls}",
+                sitename="ソフマップ",
+                image_url=f"https://www.sofmap.com/images/{i}.jpg",
+                stock_msg="在庫あり",
+                stock_quantity=1,
+                sub_urls=[f"https://www.sofmap.com/used/{i}"],
+                others={"point": 10, "sub_price": 900 + i},
+            )
+            for i in range(count)
+        ]
+    )
+
+
+def orm_convert(results: search_model.SearchResults) -> list[m_pricelog.PriceLog]:
+    # 以前の DBModelConvert.searchresult_to_db_models (sofmap) と同じ処理
+    pl_results: list[m_pricelog.PriceLog] = []
+    for parseresult in results.results:
+        pricelog = m_pricelog.PriceLog(
+            title=parseresult.title,
+            price=parseresult.price,
+            condition=parseresult.condition,
+            on_sale=parseresult.on_sale,
+            salename=parseresult.salename,
+            is_success=parseresult.is_success,
+            image_url=parseresult.image_url,
+            stock_msg=parseresult.stock_msg,
+            stock_quantity=parseresult.stock_quantity,
+            url=m_pricelog.URL(url=parseresult.url),
+            shop=m_pricelog.Shop(name=parseresult.sitename),
+        )
+        if parseresult.sub_urls:
+            pricelog.used_list_url = parseresult.sub_urls[0]
+        if parseresult.others.get("point"):
+            pricelog.point = parseresult.others.get("point")
+        if parseresult.others.get("sub_price"):
+            pricelog.sub_price = parseresult.others.get("sub_price")
+        pl_results.append(pricelog)
+    return pl_results
+
+
+def row_convert(results: search_model.SearchResults) -> list[m_pricelog.PriceLogRow]:
+    return searchresults_to_rows(results=results, sitename=SiteName.SOFMAP.value)
+
+
+def measure(func, results, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(results)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    converted = func(results)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del converted
+    return best, peak
+
+
+async def measure_save(name: str, entries: list) -> float:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        sessionmaker = async_sessionmaker(bind=engine, autoflush=False)
+        async with sessionmaker() as ses:
+            repo = p_repo.PriceLogRepository(ses=ses)
+            start = time.perf_counter()
+            if name == "orm":
+                await repo.save_all(pricelog_entries=entries)
+            else:
+                await repo.save_rows(rows=entries)
+            elapsed = time.perf_counter() - start
+        await engine.dispose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PriceLog converter benchmark")
+    parser.add_argument("--results", type=int, default=5000)
+    parser.add_argument("--urls", type=int, default=100, help="distinct urls")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", action="store_true", help="also save to SQLite")
+    argp = parser.parse_args()
+
+    results = create_results(count=argp.results, urls=argp.urls)
+    print(f"results: {argp.results}, urls: {argp.urls}")
+    for name, func in (("orm", orm_convert), ("rows", row_convert)):
+        best, peak = measure(func=func, results=results, repeat=argp.repeat)
+        print(
+            f"convert {name:4}: {best * 1000:8.1f} ms"
+            f" ({best / argp.results * 1e6:.2f} us/result),"
+            f" peak {peak / 1024 / 1024:.1f} MiB"
+        )
+    if not argp.save:
+        return
+    for name, func in (("orm", orm_convert), ("rows", row_convert)):
+        elapsed = asyncio.run(measure_save(name=name, entries=func(results)))
+        print(f"save    {name:4}: {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
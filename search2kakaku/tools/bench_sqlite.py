@@ -0,0 +1,171 @@
+"""
+Concurrent writer and reader throughput of SQLite with and without the storage
+profile.
+
+    python -m tools.bench_sqlite --writers 2 --readers 4 --seconds 5
+
+Each writer and reader is a separate process, as with the API, Celery and the
+CLI. Writers insert --rows PriceLog rows per commit and readers read the latest
+price logs of a URL. Each profile runs on a new database in a temporary
+directory: "default" uses no pragmas and the default pool, "configured" uses
+DATABASES "storage" of settings.py.
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel
+
+from common import read_config
+from databases.sql import util as db_util
+from domain.models.pricelog import pricelog as m_pricelog
+
+URLS = 100
+
+
+def _create_rows(count: int, seed: int) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "title": f"item {i}",
+            "price": 1000 + i,
+            "condition": "中古",
+            "on_sale": False,
+            "salename": "",
+            "is_success": True,
+            "image_url": "",
+            "stock_msg": "在庫あり",
+            "stock_quantity": 1,
+            "url_id": (seed + i) % URLS + 1,
+            "shop_id": 1,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+def setup_database(params: read_config.SQLParams, storage: read_config.StorageOptions):
+    engine = db_util.create_db_engine(params=params, storage=storage)
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(m_pricelog.Shop), [{"name": "bench"}])
+        conn.execute(
+            insert(m_pricelog.URL), [{"url": f"https://bench/{i}"} for i in range(URLS)]
+        )
+        conn.execute(insert(m_pricelog.PriceLog), _create_rows(count=5000, seed=0))
+    engine.dispose()
+
+
+def writer(params, storage, rows: int, deadline: float, queue):
+    engine = db_util.create_db_engine(params=params, storage=storage)
+    commits = errors = 0
+    latencies = []
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    insert(m_pricelog.PriceLog), _create_rows(count=rows, seed=commits)
+                )
+        except OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        commits += 1
+    engine.dispose()
+    queue.put(("writer", commits, errors, latencies))
+
+
+def reader(params, storage, deadline: float, queue):
+    engine = db_util.create_db_engine(params=params, storage=storage)
+    reads = errors = 0
+    latencies = []
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(
+                    select(m_pricelog.PriceLog)
+                    .where(m_pricelog.PriceLog.url_id == reads % URLS + 1)
+                    .order_by(m_pricelog.PriceLog.created_at.desc())
+                    .limit(50)
+                ).all()
+        except OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        reads += 1
+    engine.dispose()
+    queue.put(("reader", reads, errors, latencies))
+
+
+def _percentile(latencies: list[float], p: float) -> float:
+    if not latencies:
+        return 0.0
+    ordered = sorted(latencies)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def run_profile(name: str, storage: read_config.StorageOptions, argp) -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        params = read_config.SQLParams(
+            drivername="sqlite", database=os.path.join(tmpdir, "bench.db")
+        )
+        setup_database(params=params, storage=storage)
+        queue = multiprocessing.Queue()
+        deadline = time.time() + argp.seconds
+        processes = [
+            multiprocessing.Process(
+                target=writer, args=(params, storage, argp.rows, deadline, queue)
+            )
+            for _ in range(argp.writers)
+        ] + [
+            multiprocessing.Process(
+                target=reader, args=(params, storage, deadline, queue)
+            )
+            for _ in range(argp.readers)
+        ]
+        for process in processes:
+            process.start()
+        results = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+    for kind in ("writer", "reader"):
+        done = sum(r[1] for r in results if r[0] == kind)
+        errors = sum(r[2] for r in results if r[0] == kind)
+        latencies = [lat for r in results if r[0] == kind for lat in r[3]]
+        unit = "commits" if kind == "writer" else "reads"
+        print(
+            f"{name:10} {kind}s: {done / argp.seconds:9.1f} {unit}/s,"
+            f" p95 {_percentile(latencies, 0.95) * 1000:7.1f} ms,"
+            f" errors {errors}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite storage profile benchmark")
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=20, help="rows per commit")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    argp = parser.parse_args()
+
+    print(
+        f"writers: {argp.writers}, readers: {argp.readers},"
+        f" rows per commit: {argp.rows}, seconds: {argp.seconds}"
+    )
+    run_profile(name="default", storage=read_config.StorageOptions(), argp=argp)
+    run_profile(
+        name="configured", storage=read_config.get_databases().storage, argp=argp
+    )
+
+
+if __name__ == "__main__":
+    main()
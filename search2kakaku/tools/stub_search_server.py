@@ -0,0 +1,89 @@
+"""
+Stand-in for external_search to run searches without the real service.
+
+    uvicorn tools.stub_search_server:app --port 8060
+
+Returns fixed results for every search. The batch API is advertised unless the
+environment variable STUB_NO_BATCH is set, which can be used to check the
+fallback to single calls.
+"""
+
+import os
+import zlib
+
+from fastapi import FastAPI, HTTPException
+
+from app.getdata.models.info import InfoRequest, InfoResponse, CategoryInfo
+from app.getdata.models.search import SearchRequest, SearchResponse, SearchResult
+
+MAX_BATCH_SIZE = 50
+RESULTS_PER_SEARCH = 3
+
+app = FastAPI()
+stats = {"search": 0, "search_batch": 0, "batched_requests": 0}
+
+
+def create_response(searchreq: SearchRequest) -> SearchResponse:
+    if not searchreq.url and not searchreq.search_keyword:
+        return SearchResponse(error_msg="Either search_keyword or url is required.")
+    seed = zlib.crc32((searchreq.url or searchreq.search_keyword).encode())
+    return SearchResponse(
+        results=[
+            SearchResult(
+                title=f"{searchreq.search_keyword or 'item'} {i}",
+                price=1000 + seed % 1000 + i * 100,
+                condition="中古",
+                is_success=True,
+                url=searchreq.url,
+                sitename=searchreq.sitename,
+                image_url="",
+                stock_msg="在庫あり",
+                stock_quantity=1,
+                others={},
+            )
+            for i in range(RESULTS_PER_SEARCH)
+        ]
+    )
+
+
+@app.get("/api/capabilities/")
+async def capabilities():
+    if os.environ.get("STUB_NO_BATCH"):
+        return {"search_batch": False}
+    return {"search_batch": True, "max_batch_size": MAX_BATCH_SIZE}
+
+
+@app.post("/api/search/")
+async def search(searchreq: SearchRequest) -> SearchResponse:
+    stats["search"] += 1
+    return create_response(searchreq)
+
+
+@app.post("/api/search/batch/")
+async def search_batch(data: dict):
+    if os.environ.get("STUB_NO_BATCH"):
+        raise HTTPException(status_code=404)
+    searchreqs = [SearchRequest(**req) for req in data.get("requests", [])]
+    stats["search_batch"] += 1
+    stats["batched_requests"] += len(searchreqs)
+    return {
+        "results": [
+            create_response(searchreq).model_dump(mode="json")
+            for searchreq in searchreqs
+        ]
+    }
+
+
+@app.post("/api/search/info/")
+async def search_info(inforeq: InfoRequest) -> InfoResponse:
+    return InfoResponse(
+        results=[
+            CategoryInfo(gid="1", name="PCパーツ"),
+            CategoryInfo(gid="2", name="スマートフォン"),
+        ]
+    )
+
+
+@app.get("/api/stats/")
+async def get_stats():
+    return stats
@@ -10,6 +10,7 @@ from domain.models.pricelog import pricelog
 from domain.models.notification import notification
 from databases.sql import util as db_util
 from app.update import scraping_urls
+from app.getdata import http_client_lifespan
 
 CALLER_TYPE = "user"
 
@@ -19,6 +20,17 @@ def set_argparse():
         description="アップデート対象のURLを取得しログに登録します。"
     )
     parser.add_argument("--url_id", type=int, help="単一のurl_idを指定する")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="価格変動の少ないURLをスキップせず、すべての対象URLを更新する",
+    )
+    parser.add_argument(
+        "--resume",
+        type=int,
+        metavar="ACTIVITYLOG_ID",
+        help="中断した更新(ActivityLogのid)を再開する。完了済みのURLはスキップする",
+    )
     return parser.parse_args()
 
 
@@ -30,11 +42,17 @@ async def main():
     argp = set_argparse()
 
     db_util.create_db_and_tables()
-    async for ses in db_util.get_async_session():
-        await scraping_urls.scraping_and_save_target_urls(
-            ses=ses, log=log, caller_type=CALLER_TYPE, url_id=argp.url_id
-        )
+    async with http_client_lifespan():
+        async for ses in db_util.get_async_session():
+            await scraping_urls.scraping_and_save_target_urls(
+                ses=ses,
+                log=log,
+                caller_type=CALLER_TYPE,
+                url_id=argp.url_id,
+                force=argp.force,
+                resume_activitylog_id=argp.resume,
+            )
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())